@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .models import Usuario
-from .database import get_db
+from .database import get_db, get_async_db
 from .schemas import UserCreate, Token, MessageResponse, ErrorResponse
 import os
 import hashlib
@@ -23,8 +25,12 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+async def buscar_usuario(db: AsyncSession, email: str):
+    resultado = await db.execute(select(Usuario).where(Usuario.email == email))
+    return resultado.scalars().first()
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await buscar_usuario(db, email)
     if not user or not verify_password(password, user.senha_hash):
         return False
     return user
@@ -35,7 +41,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Não foi possível validar as credenciais",
@@ -49,7 +55,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    user = await buscar_usuario(db, email)
     if user is None:
         raise credentials_exception
     return user
@@ -90,8 +96,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
                     }
                 }
             })
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=400, detail="Usuário ou senha inválidos")
     access_token = create_access_token(data={"sub": user.email})
@@ -1,14 +1,162 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
 
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./db.sqlite3')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Réplica para leituras (dashboard). Sem ela, as leituras usam uma conexão
+# somente leitura ao próprio DATABASE_URL, com pool separado.
+READ_DATABASE_URL = os.getenv('READ_DATABASE_URL')
+# Uma réplica pode estar atrasada em relação ao banco de escrita, de onde vêm
+# as versões (usuarios.versao_dados/versao_previsoes) do usuário autenticado
+LEITURA_EM_REPLICA = bool(READ_DATABASE_URL)
+
+# Perfil de desempenho do SQLite aplicado em toda nova conexão.
+# WAL permite que leituras (/metrics) rodem enquanto uma importação escreve.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),  # negativo = KiB (64 MB)
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),  # ms
+}
+
+# Pool de conexões (QueuePool) usado para Postgres e demais bancos servidor
+DB_POOL = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),  # s esperando conexão livre
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),  # s até reabrir a conexão
+    'pool_pre_ping': True,
+}
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+
+# PRAGMAs que alteram o arquivo do banco não se aplicam a conexões somente leitura
+PRAGMAS_DE_ESCRITA = ('journal_mode', 'synchronous')
+
+# Drivers usados pelos engines assíncronos
+DRIVERS_ASSINCRONOS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+def _aplicar_pragmas(somente_leitura):
+    pragmas = {
+        nome: valor for nome, valor in SQLITE_PRAGMAS.items()
+        if not (somente_leitura and nome in PRAGMAS_DE_ESCRITA)
+    }
+
+    def aplicar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome}={valor}")
+        cursor.close()
+    return aplicar
+
+def _normalizar_url(url):
+    # Render/Heroku fornecem postgres://, que o SQLAlchemy 1.4 não aceita
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return make_url(url)
+
+def _sqlite_em_memoria(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def _configuracao(url, somente_leitura, assincrono):
+    """URL e opções de create_engine comuns aos engines síncronos e assíncronos"""
+    url = _normalizar_url(url)
+    backend = url.get_backend_name()
+    if assincrono:
+        if backend not in DRIVERS_ASSINCRONOS:
+            raise ValueError(f"Nenhum driver assíncrono configurado para '{backend}'")
+        url = url.set(drivername=DRIVERS_ASSINCRONOS[backend])
+    # Engines assíncronos exigem a variante asyncio do QueuePool
+    pool = AsyncAdaptedQueuePool if assincrono else QueuePool
+
+    if backend == 'sqlite':
+        opcoes = {'connect_args': {"check_same_thread": False}}
+        if not _sqlite_em_memoria(url):
+            # Arquivo: reaproveitar conexões evita refazer os PRAGMAs a cada requisição
+            opcoes.update(poolclass=pool, pool_size=DB_POOL['pool_size'], max_overflow=DB_POOL['max_overflow'])
+            if somente_leitura:
+                caminho = os.path.abspath(url.database)
+                url = url.set(database=f"file:{caminho}?mode=ro", query={'uri': 'true'})
+        return url, opcoes
+
+    connect_args = {}
+    if backend == 'postgresql':
+        if assincrono:
+            # asyncpg não aceita `options`; os parâmetros vão em server_settings
+            parametros = {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}
+            if somente_leitura:
+                parametros['default_transaction_read_only'] = 'on'
+            connect_args['server_settings'] = parametros
+        else:
+            parametros = [f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"]
+            if somente_leitura:
+                parametros.append("-c default_transaction_read_only=on")
+            connect_args['options'] = ' '.join(parametros)
+    return url, dict(DB_POOL, poolclass=pool, connect_args=connect_args)
+
+def criar_engine(url=DATABASE_URL, somente_leitura=False):
+    """
+    Cria o engine conforme o dialeto da URL. Usado pela API e pelo ML,
+    para que ambos compartilhem a mesma configuração de conexão.
+    Com `somente_leitura`, o SQLite é aberto via URI mode=ro e o Postgres
+    com default_transaction_read_only.
+    """
+    url, opcoes = _configuracao(url, somente_leitura, assincrono=False)
+    engine = create_engine(url, **opcoes)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine, 'connect', _aplicar_pragmas(somente_leitura))
+    return engine
+
+def criar_engine_async(url=DATABASE_URL, somente_leitura=False):
+    """
+    Versão assíncrona de criar_engine (aiosqlite / asyncpg), com o mesmo
+    pool, PRAGMAs e timeouts. Usada pelos endpoints `async def`, que não
+    ocupam uma thread do threadpool enquanto esperam o banco.
+    """
+    url, opcoes = _configuracao(url, somente_leitura, assincrono=True)
+    engine = create_async_engine(url, **opcoes)
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _aplicar_pragmas(somente_leitura))
+    return engine
+
+engine = criar_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engines assíncronos (autenticação, métricas, previsões); as leituras do dashboard
+# têm engine e pool próprios. Só elas leem da réplica: não há engine síncrono de leitura.
+# SQLite em memória não pode ser aberto por outra conexão: leituras usam o mesmo engine
+async_engine = criar_engine_async()
+AsyncSessionLocal = sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+if READ_DATABASE_URL:
+    async_read_engine = criar_engine_async(READ_DATABASE_URL, somente_leitura=True)
+elif _sqlite_em_memoria(engine.url):
+    async_read_engine = async_engine
+else:
+    async_read_engine = criar_engine_async(DATABASE_URL, somente_leitura=True)
+AsyncReadSessionLocal = sessionmaker(bind=async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    """Sessão assíncrona para endpoints somente leitura"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def fechar_engines_async():
+    """Fecha os pools assíncronos; cada conexão aiosqlite mantém uma thread própria"""
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
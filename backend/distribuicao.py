@@ -0,0 +1,80 @@
+"""
+Distribuição do valor das vendas (ticket) em faixas logarítmicas
+
+Cada venda cai na faixa ceil(log_γ(valor)), com γ = (1 + α) / (1 - α).
+Todo valor da faixa i está a no máximo α (erro relativo) do representante
+2γ^i / (γ + 1), então um percentil estimado pelas contagens erra no máximo
+α em relação ao valor real. As faixas são as mesmas para todos os usuários
+e meses: juntar duas distribuições é somar as contagens de cada faixa, que
+é o que a importação faz em vendas_ticket e o /metrics faz ao somar meses.
+"""
+from collections import Counter
+import math
+
+# Erro relativo máximo dos percentis. Mudar exige recalcular vendas_ticket.
+PRECISAO = 0.01
+GAMMA = (1 + PRECISAO) / (1 - PRECISAO)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Valores abaixo disso (zero, estornos) ficam na faixa do mínimo
+VALOR_MINIMO = 0.01
+
+QUANTIS = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+def faixa_valor(valor):
+    """Índice da faixa de um valor de venda"""
+    return math.ceil(math.log(max(valor, VALOR_MINIMO)) / _LOG_GAMMA)
+
+def representante(indice):
+    """Valor que representa a faixa (erro relativo <= PRECISAO para todo valor dela)"""
+    return 2 * GAMMA ** indice / (GAMMA + 1)
+
+def contar_faixas(valores):
+    """Contagens por faixa de uma sequência de valores: [(faixa, num_vendas)] ordenado"""
+    return sorted(Counter(faixa_valor(valor) for valor in valores).items())
+
+def percentis(contagens):
+    """p50/p90/p99 a partir de [(faixa, num_vendas)] ordenado por faixa"""
+    total = sum(num for _, num in contagens)
+    resultado = dict.fromkeys(QUANTIS)
+    if not total:
+        return resultado
+    for nome, quantil in QUANTIS.items():
+        posicao = quantil * (total - 1)
+        acumulado = 0
+        for indice, num in contagens:
+            acumulado += num
+            if acumulado > posicao:
+                resultado[nome] = round(representante(indice), 2)
+                break
+    return resultado
+
+def _degrau(valor):
+    """Maior número da série 1-2-5 (x potência de 10) que não passa do valor"""
+    base = 10 ** math.floor(math.log10(valor) + 1e-9)
+    mantissa = valor / base
+    return round((5 if mantissa >= 5 - 1e-9 else 2 if mantissa >= 2 - 1e-9 else 1) * base, 10)
+
+def _proximo_degrau(degrau):
+    base = 10 ** math.floor(math.log10(degrau) + 1e-9)
+    return round(degrau * (2.5 if round(degrau / base) == 2 else 2), 10)
+
+def histograma(contagens):
+    """
+    Histograma para exibição, com limites na série 1-2-5 (10, 20, 50, 100...).
+    Cada faixa entra no intervalo do seu representante; intervalos vazios
+    entre o menor e o maior valor aparecem com zero vendas.
+    """
+    if not contagens:
+        return []
+    por_degrau = Counter()
+    for indice, num in contagens:
+        por_degrau[_degrau(max(representante(indice), VALOR_MINIMO))] += num
+
+    barras = []
+    degrau, ultimo = min(por_degrau), max(por_degrau)
+    while degrau <= ultimo:
+        proximo = _proximo_degrau(degrau)
+        barras.append({"de": degrau, "ate": proximo, "num_vendas": por_degrau.get(degrau, 0)})
+        degrau = proximo
+    return barras
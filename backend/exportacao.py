@@ -0,0 +1,74 @@
+"""
+Exportação de vendas e previsões em NDJSON ou CSV, em streaming
+
+As linhas saem do banco em lotes de EXPORT_YIELD_PER por um cursor do lado
+do servidor (yield_per) e cada lote é serializado e enviado antes do
+próximo ser lido, então a memória não cresce com o tamanho da exportação.
+"""
+import csv
+import io
+import os
+from sqlalchemy import select
+from .database import async_read_engine
+from .models import Produto, Venda, Forecast
+from .respostas import serializar_json
+
+# Linhas lidas do cursor (e enviadas) por vez
+EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', '5000'))
+
+# Formato -> tipo de mídia da resposta
+FORMATOS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+def consulta_vendas(usuario_id, inicio=None, fim=None):
+    """Vendas do usuário no período, pela ordem do índice (usuario_id, data)"""
+    consulta = (
+        select(
+            Venda.id, Venda.data, Venda.produto_id, Produto.nome.label('produto'), Produto.categoria,
+            Venda.quantidade, Venda.valor_total,
+        )
+        .join(Produto, Venda.produto_id == Produto.id)
+        .where(Venda.usuario_id == usuario_id)
+    )
+    if inicio is not None:
+        consulta = consulta.where(Venda.data >= inicio)
+    if fim is not None:
+        consulta = consulta.where(Venda.data <= fim)
+    return consulta.order_by(Venda.data, Venda.id)
+
+def consulta_previsoes(usuario_id, inicio=None, fim=None):
+    """Previsões do usuário com data_prevista no período, pela ordem de (data_prevista, produto_id)"""
+    consulta = (
+        select(
+            Forecast.produto_id, Produto.nome.label('produto'), Forecast.data_prevista,
+            Forecast.qtd_prevista, Forecast.intervalo_conf,
+        )
+        .join(Produto, Forecast.produto_id == Produto.id)
+        .where(Forecast.usuario_id == usuario_id)
+    )
+    if inicio is not None:
+        consulta = consulta.where(Forecast.data_prevista >= inicio)
+    if fim is not None:
+        consulta = consulta.where(Forecast.data_prevista <= fim)
+    return consulta.order_by(Forecast.data_prevista, Forecast.produto_id)
+
+def _ndjson(colunas, linhas):
+    return b''.join(serializar_json(dict(zip(colunas, linha))) + b'\n' for linha in linhas)
+
+def _csv(linhas):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(linhas)
+    return buffer.getvalue().encode('utf-8')
+
+async def exportar(consulta, formato, yield_per=EXPORT_YIELD_PER):
+    """
+    Gerador assíncrono com o corpo da exportação, um bloco por lote do cursor.
+    Usa uma conexão própria do engine de leitura, aberta durante o streaming
+    (a sessão da requisição pode ser fechada antes do fim da resposta).
+    """
+    async with async_read_engine.connect() as conn:
+        resultado = await conn.stream(consulta.execution_options(yield_per=yield_per))
+        colunas = list(resultado.keys())
+        if formato == 'csv':
+            yield _csv([colunas])
+        async for lote in resultado.partitions():
+            yield _csv(lote) if formato == 'csv' else _ndjson(colunas, lote)
@@ -0,0 +1,633 @@
+"""
+Importação em lote de vendas a partir de CSV (puro ou gzip) e Parquet
+"""
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from .database import SessionLocal
+from .distribuicao import faixa_valor
+from .jobs import atualizar_job
+from .models import Usuario, Produto, Venda, VendaMensal, VendaTicket, Importacao, VendaHash
+
+# Quantidade de vendas inseridas por executemany
+BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '5000'))
+
+# Tamanho dos blocos lidos do upload (o arquivo nunca é carregado inteiro)
+CHUNK_LEITURA = int(os.getenv('IMPORT_CHUNK_BYTES', str(64 * 1024)))
+
+# Modo paralelo: processos de parsing (0 = um por núcleo), tamanho de cada
+# faixa de bytes e tamanho mínimo do arquivo para ativar automaticamente
+IMPORT_PROCESSOS = int(os.getenv('IMPORT_PROCESSOS', '0')) or os.cpu_count() or 1
+FAIXA_BYTES = int(os.getenv('IMPORT_FAIXA_BYTES', str(8 * 1024 * 1024)))
+PARALELO_MIN_BYTES = int(os.getenv('IMPORT_PARALELO_MIN_BYTES', str(64 * 1024 * 1024)))
+
+# Venda já convertida; é o formato trocado entre leitores (CSV, Parquet,
+# processos de parsing) e o gravador
+CAMPOS = ('data', 'produto', 'categoria', 'preco', 'quantidade', 'valor_total', 'hash')
+Linha = namedtuple('Linha', CAMPOS)
+
+# Extensões aceitas no upload e assinaturas (magic bytes) dos formatos além do CSV puro
+EXTENSOES_ACEITAS = ('.csv', '.csv.gz', '.parquet')
+MAGIC_GZIP = b'\x1f\x8b'
+MAGIC_PARQUET = b'PAR1'
+
+# Modos de validação: 'estrito' (uma linha inválida cancela tudo), 'parcial'
+# (grava as válidas) e 'validar' (só gera o relatório, nada é gravado)
+MODOS_VALIDACAO = ('estrito', 'parcial', 'validar')
+# Diferença máxima aceita entre valor_total e preco * quantidade
+TOLERANCIA_VALOR = float(os.getenv('IMPORT_TOLERANCIA_VALOR', '0.01'))
+# Quantidade de linhas rejeitadas detalhadas no relatório (o total é sempre contado)
+MAX_REJEICOES = int(os.getenv('IMPORT_MAX_REJEICOES', '100'))
+
+# Limite de parâmetros por IN (SQLite antigo aceita no máximo 999 variáveis)
+MAX_IN_PARAMS = 500
+
+def iter_linhas(binario, encoding='utf-8-sig', tamanho=CHUNK_LEITURA):
+    """Decodifica o arquivo binário em blocos e gera uma linha de texto por vez"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    resto = ''
+    while True:
+        bloco = binario.read(tamanho)
+        resto += decoder.decode(bloco, final=not bloco)
+        if '\n' in resto:
+            partes = resto.split('\n')
+            resto = partes.pop()
+            for parte in partes:
+                yield parte + '\n'
+        if not bloco:
+            break
+    if resto:
+        yield resto
+
+def ler_csv(binario):
+    """csv.DictReader alimentado em streaming, com memória constante"""
+    return csv.DictReader(iter_linhas(binario))
+
+def salvar_upload(origem, suffix=''):
+    """Copia o upload para um arquivo temporário calculando o SHA-256 no caminho"""
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as destino:
+        for bloco in iter(lambda: origem.read(CHUNK_LEITURA), b''):
+            hasher.update(bloco)
+            destino.write(bloco)
+    return destino.name, hasher.hexdigest()
+
+def fingerprint(data, produto, categoria, preco, quantidade, valor_total):
+    """Hash dos valores já convertidos (3500.00 e 3500.0 geram o mesmo hash)"""
+    chave = '|'.join((
+        data.isoformat(), produto, categoria or '',
+        repr(preco), str(quantidade), repr(valor_total),
+    ))
+    return hashlib.blake2b(chave.encode('utf-8'), digest_size=16).hexdigest()
+
+def fingerprint_ocorrencia(hash_linha, ocorrencia):
+    """
+    Hash da n-ésima linha idêntica do arquivo. Vendas iguais (mesmo dia,
+    produto e valores) são vendas distintas e todas são gravadas; reenviar o
+    arquivo, ou outro que repita as mesmas linhas, gera os mesmos hashes.
+    A primeira ocorrência mantém o hash da linha.
+    """
+    if ocorrencia == 1:
+        return hash_linha
+    return hashlib.blake2b(f"{hash_linha}#{ocorrencia}".encode('utf-8'), digest_size=16).hexdigest()
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+def _numero(valor):
+    """float() que recusa nan e inf, como a conversão do Parquet"""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(valor)
+    return numero
+
+def _campo(row, nome, conversor, padrao=None):
+    valor = row.get(nome)
+    if valor is None or valor.strip() == '':
+        if padrao is None:
+            raise ValueError(f"{nome} ausente")
+        return padrao
+    try:
+        return conversor(valor)
+    except ValueError:
+        raise ValueError(f"valor inválido em {nome}: {valor!r}")
+
+def parse_row(row):
+    """
+    Converte e valida uma linha do CSV (incluindo o hash da venda).
+    Levanta ValueError com o motivo quando a linha é inválida.
+    """
+    data = _campo(row, 'data', _data)
+    produto = _campo(row, 'produto', str)
+    preco = _campo(row, 'preco', _numero, 0.0)
+    quantidade = _campo(row, 'quantidade', int)
+    valor_total = _campo(row, 'valor_total', _numero)
+    if preco and abs(valor_total - preco * quantidade) > TOLERANCIA_VALOR:
+        raise ValueError(f"valor_total {valor_total} difere de preco * quantidade ({preco * quantidade:.2f})")
+
+    valores = (data, produto, row.get('categoria', ''), preco, quantidade, valor_total)
+    return Linha(*valores, fingerprint(*valores))
+
+def _converter_lote(rows, primeira_linha):
+    """Converte um bloco de linhas: (válidas, [(número da linha, motivo), ...])"""
+    validas = []
+    rejeitadas = []
+    for numero, row in enumerate(rows, primeira_linha):
+        try:
+            validas.append(parse_row(row))
+        except ValueError as e:
+            rejeitadas.append((numero, str(e)))
+    return validas, rejeitadas
+
+def _buscar_ids(db, nomes, cache):
+    for i in range(0, len(nomes), MAX_IN_PARAMS):
+        parte = nomes[i:i + MAX_IN_PARAMS]
+        resultado = db.execute(select(Produto.id, Produto.nome).where(Produto.nome.in_(parte)))
+        for produto_id, nome in resultado:
+            cache[nome] = produto_id
+
+def _resolver_produtos(db, cache, lote):
+    """Garante que todos os produtos do lote estejam no cache nome -> id"""
+    novos = {}
+    for linha in lote:
+        nome = linha.produto
+        if nome not in cache and nome not in novos:
+            novos[nome] = {'nome': nome, 'categoria': linha.categoria, 'preco': linha.preco}
+    if not novos:
+        return
+
+    _buscar_ids(db, list(novos), cache)
+    faltantes = [dados for nome, dados in novos.items() if nome not in cache]
+    if faltantes:
+        db.execute(Produto.__table__.insert(), faltantes)
+        _buscar_ids(db, [dados['nome'] for dados in faltantes], cache)
+
+def _abrir_ocorrencias():
+    """
+    Contagem por hash das linhas já vistas no arquivo, num SQLite privado em
+    disco (nome vazio: apagado ao fechar). Fora da memória, com o cache de
+    páginas padrão, para que arquivos de milhões de linhas distintas não
+    guardem uma entrada por linha.
+    """
+    ocorrencias = sqlite3.connect('', isolation_level=None)
+    ocorrencias.execute("PRAGMA journal_mode=OFF")
+    ocorrencias.execute("CREATE TABLE ocorrencias (hash TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID")
+    return ocorrencias
+
+def _numerar_ocorrencias(ocorrencias, linhas):
+    """Troca o hash de cada linha pelo da sua ocorrência no arquivo, somando as do lote às anteriores"""
+    no_lote = Counter(linha.hash for linha in linhas)
+    hashes = list(no_lote)
+    anteriores = {}
+    for i in range(0, len(hashes), MAX_IN_PARAMS):
+        parte = hashes[i:i + MAX_IN_PARAMS]
+        anteriores.update(ocorrencias.execute(
+            f"SELECT hash, n FROM ocorrencias WHERE hash IN ({','.join('?' * len(parte))})", parte
+        ))
+    ocorrencias.executemany(
+        "INSERT INTO ocorrencias (hash, n) VALUES (?, ?) ON CONFLICT (hash) DO UPDATE SET n = n + excluded.n",
+        no_lote.items(),
+    )
+
+    vistas = Counter()
+    numeradas = []
+    for linha in linhas:
+        vistas[linha.hash] += 1
+        ocorrencia = anteriores.get(linha.hash, 0) + vistas[linha.hash]
+        numeradas.append(linha._replace(hash=fingerprint_ocorrencia(linha.hash, ocorrencia)))
+    return numeradas
+
+def _filtrar_duplicadas(db, lote, usuario_id):
+    """Remove do lote as vendas cujo hash já está gravado (ou repetido no próprio lote)"""
+    por_hash = {}
+    for linha in lote:
+        por_hash.setdefault(linha.hash, linha)
+
+    hashes = list(por_hash)
+    for i in range(0, len(hashes), MAX_IN_PARAMS):
+        existentes = db.execute(
+            select(VendaHash.hash)
+            .where(VendaHash.usuario_id == usuario_id, VendaHash.hash.in_(hashes[i:i + MAX_IN_PARAMS]))
+        )
+        for (h,) in existentes:
+            del por_hash[h]
+    return por_hash
+
+# INSERT ... ON CONFLICT DO UPDATE de cada dialeto, usado para somar nos resumos
+# (vendas_mensais e vendas_ticket)
+INSERTS_UPSERT = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def chave_mes(data):
+    """Mês da venda no formato inteiro yyyymm (vendas.mes e chave de vendas_mensais)"""
+    return data.year * 100 + data.month
+
+def _upsert(db, tabela):
+    """INSERT do dialeto da sessão, com suporte a ON CONFLICT DO UPDATE"""
+    dialeto = db.get_bind().dialect.name
+    if dialeto not in INSERTS_UPSERT:
+        raise ValueError(f"Resumos de vendas não suportados no banco '{dialeto}'")
+    return INSERTS_UPSERT[dialeto](tabela)
+
+def _atualizar_resumo_mensal(db, cache, linhas, usuario_id):
+    """Soma as vendas gravadas aos totais de vendas_mensais, na mesma transação"""
+    totais = {}
+    for linha in linhas:
+        chave = (cache[linha.produto], chave_mes(linha.data))
+        receita, quantidade, num_vendas = totais.get(chave, (0.0, 0, 0))
+        totais[chave] = (receita + linha.valor_total, quantidade + linha.quantidade, num_vendas + 1)
+
+    tabela = VendaMensal.__table__
+    insert = _upsert(db, tabela)
+    db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[tabela.c.usuario_id, tabela.c.produto_id, tabela.c.mes],
+            set_={
+                'receita': tabela.c.receita + insert.excluded.receita,
+                'quantidade': tabela.c.quantidade + insert.excluded.quantidade,
+                'num_vendas': tabela.c.num_vendas + insert.excluded.num_vendas,
+            },
+        ),
+        [
+            {'usuario_id': usuario_id, 'produto_id': produto_id, 'mes': mes,
+             'receita': receita, 'quantidade': quantidade, 'num_vendas': num_vendas}
+            for (produto_id, mes), (receita, quantidade, num_vendas) in totais.items()
+        ],
+    )
+
+def _atualizar_distribuicao_ticket(db, linhas, usuario_id):
+    """Soma as vendas gravadas às contagens por faixa de valor de vendas_ticket"""
+    contagens = Counter((chave_mes(linha.data), faixa_valor(linha.valor_total)) for linha in linhas)
+    tabela = VendaTicket.__table__
+    insert = _upsert(db, tabela)
+    db.execute(
+        insert.on_conflict_do_update(
+            index_elements=[tabela.c.usuario_id, tabela.c.mes, tabela.c.faixa],
+            set_={'num_vendas': tabela.c.num_vendas + insert.excluded.num_vendas},
+        ),
+        [
+            {'usuario_id': usuario_id, 'mes': mes, 'faixa': indice, 'num_vendas': num_vendas}
+            for (mes, indice), num_vendas in contagens.items()
+        ],
+    )
+
+def _gravar_lote(db, cache, lote, usuario_id):
+    """Grava o lote e retorna quantas linhas foram descartadas como duplicadas"""
+    novas = _filtrar_duplicadas(db, lote, usuario_id)
+    if novas:
+        _resolver_produtos(db, cache, novas.values())
+        db.execute(Venda.__table__.insert(), [
+            {
+                'data': linha.data,
+                'produto_id': cache[linha.produto],
+                'usuario_id': usuario_id,
+                'quantidade': linha.quantidade,
+                'valor_total': linha.valor_total,
+                'mes': chave_mes(linha.data),
+            }
+            for linha in novas.values()
+        ])
+        db.execute(VendaHash.__table__.insert(), [{'usuario_id': usuario_id, 'hash': h} for h in novas])
+        _atualizar_resumo_mensal(db, cache, novas.values(), usuario_id)
+        _atualizar_distribuicao_ticket(db, novas.values(), usuario_id)
+    return len(lote) - len(novas)
+
+def _estatisticas(contagem, inicio):
+    tempo = time.perf_counter() - inicio
+    total = contagem['linhas_processadas']
+    return {
+        **contagem,
+        'tempo_segundos': round(tempo, 3),
+        'linhas_por_segundo': round(total / tempo, 1) if tempo > 0 else 0.0,
+    }
+
+def _lotes(linhas, batch_size):
+    # Numeração de linhas do arquivo: a linha 1 é o cabeçalho
+    bloco = []
+    numero = 2
+    for row in linhas:
+        bloco.append(row)
+        if len(bloco) >= batch_size:
+            yield _converter_lote(bloco, numero)
+            numero += len(bloco)
+            bloco = []
+    if bloco:
+        yield _converter_lote(bloco, numero)
+
+def _gravar_lotes(db, lotes, usuario_id, modo='estrito', progresso=None):
+    """
+    Consome lotes (válidas, rejeitadas) gravando as válidas conforme o modo.
+    Os lotes chegam na ordem do arquivo, então as linhas idênticas são
+    numeradas aqui (fingerprint_ocorrencia), inclusive no modo paralelo; só
+    o lote corrente fica em memória, as contagens anteriores ficam em disco.
+    No modo estrito nada mais é gravado após a primeira rejeição (quem chama
+    faz o rollback), mas o arquivo continua sendo validado até o fim para que
+    o relatório liste todas as linhas com problema.
+    """
+    inicio = time.perf_counter()
+    cache = {}
+    contagem = {'linhas_processadas': 0, 'linhas_duplicadas': 0, 'linhas_rejeitadas': 0}
+    rejeicoes = []
+    ocorrencias = _abrir_ocorrencias()
+
+    try:
+        for validas, rejeitadas in lotes:
+            contagem['linhas_rejeitadas'] += len(rejeitadas)
+            rejeicoes.extend(
+                {'linha': numero, 'motivo': motivo}
+                for numero, motivo in rejeitadas[:MAX_REJEICOES - len(rejeicoes)]
+            )
+            gravar = modo == 'parcial' or (modo == 'estrito' and not contagem['linhas_rejeitadas'])
+            if gravar and validas:
+                validas = _numerar_ocorrencias(ocorrencias, validas)
+                contagem['linhas_duplicadas'] += _gravar_lote(db, cache, validas, usuario_id)
+            contagem['linhas_processadas'] += len(validas) + len(rejeitadas)
+            if progresso:
+                progresso(**_estatisticas(contagem, inicio))
+    finally:
+        ocorrencias.close()
+
+    resultado = _estatisticas(contagem, inicio)
+    resultado['rejeicoes'] = rejeicoes
+    return resultado
+
+def importar_vendas(db, linhas, usuario_id, modo='estrito', batch_size=BATCH_SIZE, progresso=None):
+    """
+    Importa as linhas do CSV (dicts do csv.DictReader) em lotes.
+
+    Cada lote é validado antes da gravação (datas, números e
+    valor_total ≈ preco * quantidade); as linhas inválidas entram no
+    relatório `rejeicoes` e o `modo` decide o que é gravado.
+    Os produtos de cada lote são resolvidos com uma consulta só e os que
+    faltam são criados de uma vez; as vendas entram via executemany do Core.
+    Linhas idênticas no mesmo arquivo são vendas distintas e todas são
+    gravadas; linhas cujo hash (com o número da ocorrência) já existe para o
+    usuário são ignoradas, então reenviar o mesmo arquivo (ou exportações
+    sobrepostas) não duplica vendas.
+    Os totais de vendas_mensais são atualizados junto com cada lote.
+    `progresso`, se informado, é chamado após cada lote com as estatísticas
+    parciais. O commit fica a cargo de quem chama.
+    """
+    return _gravar_lotes(db, _lotes(linhas, batch_size), usuario_id, modo, progresso)
+
+def dividir_faixas(caminho, tamanho_faixa=FAIXA_BYTES):
+    """
+    Lê o cabeçalho e divide o restante do arquivo em faixas de bytes
+    [inicio, fim) que sempre começam e terminam em quebra de linha.
+    """
+    tamanho = os.path.getsize(caminho)
+    faixas = []
+    with open(caminho, 'rb') as arquivo:
+        cabecalho = next(csv.reader([arquivo.readline().decode('utf-8-sig')]))
+        inicio = arquivo.tell()
+        while inicio < tamanho:
+            alvo = inicio + tamanho_faixa
+            if alvo >= tamanho:
+                fim = tamanho
+            else:
+                arquivo.seek(alvo)
+                arquivo.readline()
+                fim = arquivo.tell()
+            faixas.append((inicio, fim))
+            inicio = fim
+    return cabecalho, faixas
+
+def _parse_faixa(caminho, cabecalho, inicio, fim):
+    """
+    Executado nos processos filhos: converte uma faixa em Linhas tipadas.
+    Retorna (válidas, rejeitadas numeradas a partir de 1 dentro da faixa, total de linhas).
+    """
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        texto = arquivo.read(fim - inicio).decode('utf-8')
+    rows = list(csv.DictReader(io.StringIO(texto, newline=''), fieldnames=cabecalho))
+    return _converter_lote(rows, 1) + (len(rows),)
+
+def _lotes_paralelos(caminho, processos, batch_size, tamanho_faixa=FAIXA_BYTES):
+    cabecalho, faixas = dividir_faixas(caminho, tamanho_faixa)
+    faixas = iter(faixas)
+    # spawn: o processo da API tem threads ativas, fork não é seguro aqui
+    pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        # No máximo duas faixas por processo em andamento: memória limitada
+        pendentes = deque(
+            pool.submit(_parse_faixa, caminho, cabecalho, *faixa)
+            for _, faixa in zip(range(processos * 2), faixas)
+        )
+        numero = 2
+        while pendentes:
+            validas, rejeitadas, total = pendentes.popleft().result()
+            proxima = next(faixas, None)
+            if proxima:
+                pendentes.append(pool.submit(_parse_faixa, caminho, cabecalho, *proxima))
+            # Numeração local da faixa -> linha do arquivo
+            rejeitadas = [(numero + local - 1, motivo) for local, motivo in rejeitadas]
+            numero += total
+            yield validas[:batch_size], rejeitadas
+            for i in range(batch_size, len(validas), batch_size):
+                yield validas[i:i + batch_size], []
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def importar_vendas_paralelo(db, caminho, usuario_id, modo='estrito', processos=IMPORT_PROCESSOS,
+                             batch_size=BATCH_SIZE, progresso=None, tamanho_faixa=FAIXA_BYTES):
+    """
+    Variante de importar_vendas para arquivos muito grandes.
+
+    O arquivo é dividido em faixas de bytes alinhadas em quebras de linha;
+    um pool de processos faz o parsing e a validação de cada faixa e esta
+    thread, única escritora, grava os lotes na ordem do arquivo. Exige um
+    registro por linha (campos entre aspas com quebra de linha não são
+    suportados neste modo).
+    """
+    lotes = _lotes_paralelos(caminho, processos, batch_size, tamanho_faixa)
+    return _gravar_lotes(db, lotes, usuario_id, modo, progresso)
+
+def detectar_formato(caminho):
+    """Identifica o formato pelo conteúdo (magic bytes), não pela extensão"""
+    with open(caminho, 'rb') as arquivo:
+        inicio = arquivo.read(4)
+    if inicio.startswith(MAGIC_GZIP):
+        return 'csv.gz'
+    if inicio == MAGIC_PARQUET:
+        return 'parquet'
+    return 'csv'
+
+# Número decimal em texto (o que float() aceita, sem nan/inf)
+NUMERO_TEXTO = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+def _coluna(batch, nome, tipo):
+    """
+    Coluna do RecordBatch no tipo do banco e máscara dos valores presentes mas
+    inconvertíveis, que viram nulo em vez de abortar o arquivo. Texto vazio e
+    coluna ausente contam como ausentes; nan, inf e quantidade fracionária
+    são inválidos.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    indice = batch.schema.get_field_index(nome)
+    if indice < 0:
+        return pa.nulls(batch.num_rows, tipo), pa.repeat(pa.scalar(False), batch.num_rows)
+    coluna = batch.column(indice)
+    invalidos = pa.repeat(pa.scalar(False), batch.num_rows)
+    if tipo != pa.string() and (pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type)):
+        texto = pc.utf8_trim_whitespace(coluna)
+        presentes = pc.fill_null(pc.not_equal(texto, ''), False)
+        if tipo == pa.date32():
+            coluna = pc.strptime(texto, format='%Y-%m-%d', unit='s', error_is_null=True)
+        else:
+            numericos = pc.fill_null(pc.match_substring_regex(texto, NUMERO_TEXTO), False)
+            coluna = pc.if_else(numericos, texto, pa.scalar(None, texto.type)).cast(pa.float64())
+        invalidos = pc.and_(presentes, pc.is_null(coluna))
+    if pa.types.is_floating(coluna.type):
+        finitos = pc.is_finite(coluna)
+        invalidos = pc.or_(invalidos, pc.fill_null(pc.invert(finitos), False))
+        coluna = pc.if_else(finitos, coluna, pa.scalar(None, coluna.type))
+    if pa.types.is_integer(tipo) and pa.types.is_floating(coluna.type):
+        inteiros = pc.equal(coluna, pc.floor(coluna))
+        invalidos = pc.or_(invalidos, pc.fill_null(pc.invert(inteiros), False))
+        coluna = pc.if_else(inteiros, coluna, pa.scalar(None, coluna.type))
+    return coluna.cast(tipo), invalidos
+
+def _lotes_parquet(caminho, batch_size):
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Importação de Parquet requer o pacote pyarrow")
+
+    arquivo = pq.ParquetFile(caminho)
+    colunas = [c for c in CAMPOS[:-1] if c in arquivo.schema_arrow.names]
+    numero = 1
+    for batch in arquivo.iter_batches(batch_size=batch_size, columns=colunas):
+        # Conversão e validação feitas coluna a coluna pelo Arrow
+        data, _ = _coluna(batch, 'data', pa.date32())
+        produto, _ = _coluna(batch, 'produto', pa.string())
+        categoria, _ = _coluna(batch, 'categoria', pa.string())
+        categoria = pc.fill_null(categoria, '')
+        preco, preco_invalido = _coluna(batch, 'preco', pa.float64())
+        preco = pc.fill_null(preco, 0.0)
+        quantidade, quantidade_invalida = _coluna(batch, 'quantidade', pa.int64())
+        valor_total, valor_total_invalido = _coluna(batch, 'valor_total', pa.float64())
+
+        diferenca = pc.abs(pc.subtract(valor_total, pc.multiply(preco, pc.cast(quantidade, pa.float64()))))
+        motivos = [
+            ("data ausente ou inválida", pc.is_null(data)),
+            ("produto ausente", pc.or_kleene(pc.is_null(produto), pc.equal(pc.utf8_trim_whitespace(produto), ''))),
+            ("valor inválido em preco", preco_invalido),
+            ("valor inválido em quantidade", quantidade_invalida),
+            ("quantidade ausente", pc.is_null(quantidade)),
+            ("valor inválido em valor_total", valor_total_invalido),
+            ("valor_total ausente", pc.is_null(valor_total)),
+            ("valor_total difere de preco * quantidade",
+             pc.and_(pc.greater(preco, 0), pc.greater(diferenca, TOLERANCIA_VALOR))),
+        ]
+        mascaras = [pc.fill_null(mascara, False) for _, mascara in motivos]
+        invalidas = reduce(pc.or_, mascaras)
+
+        rejeitadas = {}
+        if pc.any(invalidas).as_py():
+            # O primeiro motivo encontrado prevalece
+            for (motivo, _), mascara in zip(motivos, mascaras):
+                for indice in pc.indices_nonzero(mascara).to_pylist():
+                    rejeitadas.setdefault(numero + indice, motivo)
+            validas = pc.invert(invalidas)
+            data, produto, categoria, preco, quantidade, valor_total = (
+                pc.filter(c, validas) for c in (data, produto, categoria, preco, quantidade, valor_total)
+            )
+
+        valores = zip(*(c.to_pylist() for c in (data, produto, categoria, preco, quantidade, valor_total)))
+        yield [Linha(*v, fingerprint(*v)) for v in valores], sorted(rejeitadas.items())
+        numero += batch.num_rows
+
+def importar_vendas_parquet(db, caminho, usuario_id, modo='estrito', batch_size=BATCH_SIZE, progresso=None):
+    """
+    Importa um arquivo Parquet lendo-o em RecordBatches: as colunas data,
+    produto, categoria, preco, quantidade e valor_total são convertidas e
+    validadas em bloco pelo pyarrow (dependência opcional), sem passar pelo
+    csv.DictReader. No relatório, `linha` é o número do registro (a partir de 1).
+    """
+    return _gravar_lotes(db, _lotes_parquet(caminho, batch_size), usuario_id, modo, progresso)
+
+def estado_inicial_importacao():
+    """Campos do job de importação antes do primeiro lote (os de ImportResponse)"""
+    return {
+        'linhas_processadas': 0, 'linhas_rejeitadas': 0, 'linhas_duplicadas': 0,
+        'tempo_segundos': 0.0, 'linhas_por_segundo': 0.0, 'rejeicoes': [],
+    }
+
+def executar_importacao(job_id, caminho, arquivo_hash, nome_arquivo, usuario_id, paralelo=None, modo='estrito'):
+    """
+    Job de importação: lê o arquivo salvo em disco e grava numa sessão própria.
+    Aceita CSV, CSV compactado com gzip e Parquet. Com `paralelo=None` o modo
+    paralelo (só para CSV puro) é escolhido pelo tamanho do arquivo.
+    """
+    db = SessionLocal()
+    try:
+        # Arquivo idêntico já importado por este usuário: nada a fazer
+        ja_importado = db.query(Importacao.id)\
+            .filter(Importacao.usuario_id == usuario_id, Importacao.arquivo_hash == arquivo_hash).first()
+        if ja_importado:
+            return {'mensagem': "Arquivo já importado anteriormente"}
+
+        formato = detectar_formato(caminho)
+        if paralelo is None:
+            paralelo = IMPORT_PROCESSOS > 1 and os.path.getsize(caminho) >= PARALELO_MIN_BYTES
+        progresso = lambda **parcial: atualizar_job(job_id, **parcial)
+        if formato == 'parquet':
+            resultado = importar_vendas_parquet(db, caminho, usuario_id, modo, progresso=progresso)
+        elif formato == 'csv.gz':
+            # gzip não permite acesso aleatório: sempre descompactado em streaming
+            with gzip.open(caminho, 'rb') as arquivo:
+                resultado = importar_vendas(db, ler_csv(arquivo), usuario_id, modo, progresso=progresso)
+        elif paralelo:
+            resultado = importar_vendas_paralelo(db, caminho, usuario_id, modo, progresso=progresso)
+        else:
+            with open(caminho, 'rb') as arquivo:
+                resultado = importar_vendas(db, ler_csv(arquivo), usuario_id, modo, progresso=progresso)
+
+        rejeitadas = resultado['linhas_rejeitadas']
+        if modo == 'validar':
+            validas = resultado['linhas_processadas'] - rejeitadas
+            resultado['mensagem'] = f"Validação concluída: {validas} linha(s) válida(s), {rejeitadas} rejeitada(s)"
+            return resultado
+        if modo == 'estrito' and rejeitadas:
+            db.rollback()
+            atualizar_job(job_id, **resultado)
+            raise ValueError(f"{rejeitadas} linha(s) inválida(s); nenhuma venda foi importada")
+
+        db.add(Importacao(
+            usuario_id=usuario_id,
+            arquivo_hash=arquivo_hash,
+            nome_arquivo=nome_arquivo,
+            linhas=resultado['linhas_processadas'],
+        ))
+        # Nova versão dos dados do usuário: invalida as métricas em cache
+        db.execute(
+            Usuario.__table__.update().where(Usuario.id == usuario_id)
+            .values(versao_dados=Usuario.versao_dados + 1)
+        )
+        db.commit()
+        resultado['mensagem'] = "Importação realizada"
+        return resultado
+    except Exception as e:
+        db.rollback()
+        raise ValueError(f"Erro ao processar arquivo: {str(e)}") from e
+    finally:
+        db.close()
+        os.remove(caminho)
@@ -0,0 +1,85 @@
+"""
+Execução de tarefas longas em segundo plano (importações de CSV, etc.)
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+import uuid
+
+# Um worker por padrão: o SQLite só aceita um escritor por vez
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+# Quantidade de jobs mantidos em memória para consulta de status
+MAX_JOBS = int(os.getenv('MAX_JOBS', '200'))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+def _descartar_antigos():
+    finalizados = [job_id for job_id, job in _jobs.items() if job['status'] in ('concluido', 'erro')]
+    while len(_jobs) > MAX_JOBS and finalizados:
+        del _jobs[finalizados.pop(0)]
+
+def atualizar_job(job_id, **campos):
+    with _lock:
+        if job_id in _jobs:
+            _jobs[job_id].update(campos)
+
+def obter_job(job_id, usuario_id=None, tipo=None):
+    """Cópia do estado do job; None se não existir, for de outro tipo ou de outro usuário"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or (tipo is not None and job['tipo'] != tipo):
+            return None
+        if usuario_id is not None and job['usuario_id'] != usuario_id:
+            return None
+        return dict(job)
+
+def _executar(job_id, func, args, kwargs):
+    atualizar_job(job_id, status='processando', iniciado_em=time.time())
+    try:
+        resultado = func(job_id, *args, **kwargs) or {}
+        atualizar_job(job_id, status='concluido', finalizado_em=time.time(), **resultado)
+    except Exception as e:
+        atualizar_job(job_id, status='erro', mensagem=str(e), finalizado_em=time.time())
+
+def _job_ativo(tipo, usuario_id):
+    for job in _jobs.values():
+        if job['tipo'] == tipo and job['usuario_id'] == usuario_id and job['status'] in ('pendente', 'processando'):
+            return job
+    return None
+
+def submeter_job(tipo, usuario_id, func, *args, unico=False, estado=None, **kwargs):
+    """
+    Registra um job e o coloca na fila do executor.
+
+    `func` recebe o job_id como primeiro argumento (para reportar progresso
+    via atualizar_job) e pode retornar um dict mesclado ao estado final.
+    Com `unico`, se o usuário já tem um job desse tipo pendente ou em
+    andamento, retorna esse job em vez de enfileirar outro. `estado` traz
+    campos próprios do tipo de job (contadores, listas) já com o valor
+    inicial, para que o status tenha todos eles desde o 202.
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'tipo': tipo,
+        'usuario_id': usuario_id,
+        'status': 'pendente',
+        'mensagem': None,
+        'criado_em': time.time(),
+        'iniciado_em': None,
+        'finalizado_em': None,
+        **(estado or {}),
+    }
+    with _lock:
+        ativo = _job_ativo(tipo, usuario_id) if unico else None
+        if ativo is not None:
+            return dict(ativo)
+        _jobs[job_id] = job
+        _descartar_antigos()
+        snapshot = dict(job)
+    _executor.submit(_executar, job_id, func, args, kwargs)
+    return snapshot
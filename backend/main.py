@@ -1,21 +1,28 @@
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
+from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from .models import Base, Usuario, Produto, Venda, Forecast
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Usuario
 from .auth import router as auth_router, get_current_user, get_password_hash
-from .database import get_db, engine, SessionLocal
-from .schemas import MetricsResponse, ForecastOut, ImportResponse, MLResponse, ErrorResponse
-from typing import List
-import csv
-import io
+from .database import get_async_read_db, engine, SessionLocal, fechar_engines_async
+from .migrations import aplicar_migracoes
+from .schemas import MetricsResponse, CacheMetricasResponse, ForecastOut, ImportResponse, MLResponse, ErrorResponse
+from .metricas import obter_metricas, estatisticas_cache
+from .respostas import RespostaJSON, adicionar_compressao
+from .exportacao import FORMATOS, consulta_previsoes, consulta_vendas, exportar
+from .previsoes import FORECAST_LIMITE_MAX, campos_pedidos, decodificar_cursor, listar_previsoes, versoes_na_leitura
+from .importer import estado_inicial_importacao, executar_importacao, salvar_upload, EXTENSOES_ACEITAS
+from .jobs import submeter_job, obter_job
+from ml.ml import executar_ml
+from typing import List, Optional
+from datetime import date
+import hashlib
 import os
-from datetime import datetime
 
 # Criar diretório data se não existir
 os.makedirs("data", exist_ok=True)
 
-Base.metadata.create_all(bind=engine)
+aplicar_migracoes(engine)
 
 app = FastAPI(
     title="Sistema de Vendas & Previsões ML",
@@ -89,13 +96,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# gzip (ou brotli, com brotli-asgi instalado) acima de COMPRESSAO_MIN_BYTES
+adicionar_compressao(app)
+
+# Respostas com ETag: o cliente pode guardar, mas deve revalidar (If-None-Match) a cada uso
+CACHE_CONTROL = "private, no-cache"
+
+def _etag(*partes):
+    """ETag forte a partir das versões que determinam o conteúdo da resposta"""
+    return '"' + '-'.join(str(parte) for parte in partes) + '"'
+
+def _nao_modificado(request, etag):
+    """Se o If-None-Match do cliente já corresponde à versão atual (aceita lista e W/)"""
+    enviados = request.headers.get('if-none-match')
+    if not enviados:
+        return False
+    candidatos = [valor.strip() for valor in enviados.split(',')]
+    return '*' in candidatos or etag in (c[2:] if c.startswith('W/') else c for c in candidatos)
+
+def _assinatura(request):
+    """Resumo dos parâmetros da URL, para o ETag variar com filtros e página"""
+    consulta = '&'.join(sorted(f"{chave}={valor}" for chave, valor in request.query_params.multi_items()))
+    return hashlib.sha1(consulta.encode('utf-8')).hexdigest()[:16] if consulta else ''
+
+async def _com_etag(request, etag, gerar, extras=None):
+    """
+    304 se o cliente já tem esta versão; senão o JSON produzido por gerar(),
+    marcado com o ETag. O conteúdo já sai no formato do response_model e vai
+    direto para RespostaJSON, sem nova validação. extras são cabeçalhos que
+    gerar() pode preencher (como o cursor da próxima página).
+    """
+    cabecalhos = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+    if _nao_modificado(request, etag):
+        return Response(status_code=304, headers=cabecalhos)
+    conteudo = await gerar()
+    return RespostaJSON(conteudo, headers={**cabecalhos, **(extras or {})})
+
 @app.post("/import", 
          response_model=ImportResponse,
+         status_code=202,
          tags=["Dados"],
-         summary="Importar dados de vendas via CSV",
-         description="""Upload de arquivo CSV com dados de vendas. O arquivo deve conter as colunas:
+         summary="Importar dados de vendas via CSV ou Parquet",
+         description="""Upload de arquivo com dados de vendas: CSV, CSV compactado (`.csv.gz`) ou
+         Parquet (requer o pacote opcional `pyarrow` no servidor). O formato é detectado
+         pelo conteúdo do arquivo. Colunas esperadas:
          - data (formato: YYYY-MM-DD)
          - produto (nome do produto)
          - categoria (categoria do produto)
@@ -108,29 +155,58 @@ app.add_middleware(
          data,produto,categoria,preco,quantidade,valor_total
          2024-01-15,Notebook Dell,Eletrônicos,2500.00,2,5000.00
          2024-01-20,Mouse Logitech,Periféricos,150.00,5,750.00
-         ```""",
+         ```
+         
+         Os produtos são resolvidos em lote e as vendas inseridas em blocos
+         (`IMPORT_BATCH_SIZE`, padrão 5000).
+         
+         Todas as linhas são validadas (datas, números e `valor_total ≈ preco * quantidade`)
+         e o status do job traz o relatório `rejeicoes` com a linha e o motivo de cada erro.
+         O parâmetro `modo` define o que acontece com as linhas válidas:
+         - `estrito` (padrão): qualquer linha inválida cancela toda a importação
+         - `parcial`: grava as linhas válidas e descarta as inválidas
+         - `validar`: apenas valida, nada é gravado
+         
+         A importação é idempotente: um arquivo idêntico já importado é ignorado e
+         linhas já gravadas por outra importação (mesma data, produto, quantidade e
+         valores, contando a ocorrência da linha no arquivo) são descartadas. Linhas
+         idênticas dentro do mesmo arquivo são vendas distintas e todas são gravadas.
+         
+         Arquivos grandes (`IMPORT_PARALELO_MIN_BYTES`, padrão 64 MB) são divididos em
+         faixas de linhas e convertidos em paralelo por um pool de processos
+         (`IMPORT_PROCESSOS`, padrão um por núcleo); uma única conexão grava os lotes.
+         Nesse modo cada venda deve ocupar exatamente uma linha do arquivo.
+         
+         **Importante**: a importação roda em segundo plano. A resposta traz o
+         `job_id` imediatamente; acompanhe o progresso em `GET /import/{job_id}`.""",
          responses={
-             200: {
-                 "description": "Importação realizada com sucesso",
+             202: {
+                 "description": "Arquivo recebido e importação enfileirada",
                  "content": {
                      "application/json": {
-                         "example": {"status": "Importação realizada"}
+                         "example": {
+                             "job_id": "3f2c9a7e1b8d4c6f9e0a1b2c3d4e5f60",
+                             "status": "pendente",
+                             "mensagem": None,
+                             "linhas_processadas": 0,
+                             "linhas_rejeitadas": 0,
+                             "linhas_duplicadas": 0,
+                             "tempo_segundos": 0.0,
+                             "linhas_por_segundo": 0.0,
+                             "rejeicoes": []
+                         }
                      }
                  }
              },
              400: {
-                 "description": "Erro na validação ou processamento do arquivo",
+                 "description": "Arquivo rejeitado antes do processamento",
                  "model": ErrorResponse,
                  "content": {
                      "application/json": {
                          "examples": {
                              "invalid_format": {
                                  "summary": "Formato inválido",
-                                 "value": {"detail": "Arquivo deve ser CSV"}
-                             },
-                             "parse_error": {
-                                 "summary": "Erro no processamento",
-                                 "value": {"detail": "Erro ao processar CSV: invalid literal for int()"}
+                                 "value": {"detail": "Arquivo deve ser CSV, CSV.GZ ou Parquet"}
                              }
                          }
                      }
@@ -141,44 +217,121 @@ app.add_middleware(
                  "model": ErrorResponse
              }
          })
-def import_csv(file: UploadFile = File(..., description="Arquivo CSV com dados de vendas"), db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Arquivo deve ser CSV")
+def import_csv(file: UploadFile = File(..., description="Arquivo CSV, CSV.GZ ou Parquet com dados de vendas"),
+               modo: str = Query('estrito', regex='^(estrito|parcial|validar)$', description="'estrito': uma linha inválida cancela a importação; 'parcial': grava as linhas válidas; 'validar': apenas valida"),
+               paralelo: Optional[bool] = Query(None, description="Forçar (true) ou desativar (false) o parsing em múltiplos processos; omitido = automático pelo tamanho"),
+               current_user: Usuario = Depends(get_current_user)):
+    if not file.filename.lower().endswith(EXTENSOES_ACEITAS):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser CSV, CSV.GZ ou Parquet")
     
-    try:
-        # Ler conteúdo do arquivo
-        content = file.file.read()
-        csv_content = content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        
-        for row in csv_reader:
-            # Verificar se produto existe
-            produto = db.query(Produto).filter(Produto.nome == row['produto']).first()
-            if not produto:
-                produto = Produto(
-                    nome=row['produto'], 
-                    categoria=row.get('categoria', ''), 
-                    preco=float(row.get('preco', 0))
-                )
-                db.add(produto)
-                db.flush()  # Para obter o ID
-            
-            # Criar venda
-            venda = Venda(
-                data=datetime.strptime(row['data'], '%Y-%m-%d').date(),
-                produto_id=produto.id,
-                usuario_id=current_user.id,
-                quantidade=int(row['quantidade']),
-                valor_total=float(row['valor_total'])
-            )
-            db.add(venda)
-        
-        db.commit()
-        return {"status": "Importação realizada"}
-        
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=f"Erro ao processar CSV: {str(e)}")
+    # Copiar o upload para um arquivo próprio: o UploadFile é fechado ao fim da requisição
+    caminho, arquivo_hash = salvar_upload(file.file)
+    
+    return submeter_job('importacao', current_user.id, executar_importacao,
+                        caminho, arquivo_hash, file.filename, current_user.id, paralelo, modo,
+                        estado=estado_inicial_importacao())
+
+@app.get("/import/{job_id}",
+         response_model=ImportResponse,
+         tags=["Dados"],
+         summary="Consultar status de uma importação",
+         description="""Retorna o andamento de um job criado por `POST /import`:
+         - Status (pendente, processando, concluido, erro)
+         - Linhas processadas, rejeitadas e duplicadas (ignoradas)
+         - Relatório das linhas rejeitadas (número da linha e motivo)
+         - Vazão (linhas/s) e tempo decorrido
+         
+         Só é possível consultar jobs do próprio usuário.""",
+         responses={
+             404: {
+                 "description": "Job não encontrado",
+                 "model": ErrorResponse
+             },
+             401: {
+                 "description": "Token de autenticação inválido",
+                 "model": ErrorResponse
+             }
+         })
+def get_import_status(job_id: str, current_user: Usuario = Depends(get_current_user)):
+    job = obter_job(job_id, current_user.id, tipo='importacao')
+    if job is None:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    return job
+
+def _exportacao(consulta, formato, nome):
+    """StreamingResponse da exportação, baixada como arquivo <nome>.<formato>"""
+    return StreamingResponse(
+        exportar(consulta, formato),
+        media_type=FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename="{nome}.{formato}"'},
+    )
+
+def _validar_periodo(start, end):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start deve ser anterior ou igual a end")
+
+@app.get("/export/vendas",
+         tags=["Dados"],
+         summary="Exportar vendas do usuário (NDJSON ou CSV)",
+         description="""Todas as vendas do usuário autenticado, uma por linha, em streaming:
+         `formato=ndjson` (padrão, um objeto JSON por linha) ou `formato=csv` (com cabeçalho).
+         
+         Colunas: `id, data, produto_id, produto, categoria, quantidade, valor_total`, em
+         ordem de `data`. `start` e `end` (inclusivos) restringem o período pelo índice
+         `(usuario_id, data)`. As linhas são lidas em lotes de `EXPORT_YIELD_PER` por um
+         cursor no servidor, então a memória da API não cresce com o volume exportado.""",
+         response_class=StreamingResponse,
+         responses={
+             200: {
+                 "description": "Arquivo com as vendas",
+                 "content": {"application/x-ndjson": {}, "text/csv": {}}
+             },
+             400: {
+                 "description": "Período inválido (start posterior a end)",
+                 "model": ErrorResponse
+             },
+             401: {
+                 "description": "Token de autenticação inválido",
+                 "model": ErrorResponse
+             }
+         })
+async def export_vendas(formato: str = Query('ndjson', regex='^(ndjson|csv)$', description="ndjson ou csv"),
+                        start: Optional[date] = Query(None, description="Data inicial (inclusive), YYYY-MM-DD"),
+                        end: Optional[date] = Query(None, description="Data final (inclusive), YYYY-MM-DD"),
+                        current_user: Usuario = Depends(get_current_user)):
+    _validar_periodo(start, end)
+    return _exportacao(consulta_vendas(current_user.id, start, end), formato, 'vendas')
+
+@app.get("/export/forecast",
+         tags=["Dados"],
+         summary="Exportar previsões do usuário (NDJSON ou CSV)",
+         description="""Previsões do usuário autenticado, uma por linha, em streaming:
+         `formato=ndjson` (padrão) ou `formato=csv` (com cabeçalho).
+         
+         Colunas: `produto_id, produto, data_prevista, qtd_prevista, intervalo_conf`, em
+         ordem de `(data_prevista, produto_id)`. `start` e `end` (inclusivos) filtram
+         `data_prevista`.""",
+         response_class=StreamingResponse,
+         responses={
+             200: {
+                 "description": "Arquivo com as previsões",
+                 "content": {"application/x-ndjson": {}, "text/csv": {}}
+             },
+             400: {
+                 "description": "Período inválido (start posterior a end)",
+                 "model": ErrorResponse
+             },
+             401: {
+                 "description": "Token de autenticação inválido",
+                 "model": ErrorResponse
+             }
+         })
+async def export_forecast(formato: str = Query('ndjson', regex='^(ndjson|csv)$', description="ndjson ou csv"),
+                          start: Optional[date] = Query(None, description="data_prevista inicial (inclusive), YYYY-MM-DD"),
+                          end: Optional[date] = Query(None, description="data_prevista final (inclusive), YYYY-MM-DD"),
+                          current_user: Usuario = Depends(get_current_user)):
+    _validar_periodo(start, end)
+    return _exportacao(consulta_previsoes(current_user.id, start, end), formato, 'forecast')
 
 @app.get("/metrics",
          response_model=MetricsResponse,
@@ -186,7 +339,7 @@ def import_csv(file: UploadFile = File(..., description="Arquivo CSV com dados d
          summary="Obter métricas de vendas do usuário",
          description="""Retorna métricas consolidadas das vendas do usuário logado:
          - Receita total acumulada
-         - Ticket médio por venda
+         - Ticket médio por venda, percentis (p50, p90, p99) e histograma do valor das vendas
          - Produto mais vendido (por quantidade)
          - Evolução mensal da receita
          - Top 5 produtos por receita
@@ -194,53 +347,66 @@ def import_csv(file: UploadFile = File(..., description="Arquivo CSV com dados d
          - Total de vendas realizadas
          - Quantidade de produtos únicos vendidos
          
-         Todas as métricas são filtradas pelos dados do usuário autenticado.""",
+         Todas as métricas são filtradas pelos dados do usuário autenticado e
+         calculadas em três consultas aos resumos mensais (`vendas_mensais` e
+         `vendas_ticket`), atualizados a cada importação. Os percentis vêm de contagens
+         por faixa logarítmica de valor, com erro relativo de até 1%. O resultado fica em cache até a próxima importação do usuário
+         (`METRICAS_CACHE_MAX` usuários por processo, LRU).
+         
+         `start` e `end` restringem as métricas a um período e `granularity` define os
+         períodos da evolução (`day`, `week`, `month` ou `quarter`). Períodos de meses
+         inteiros continuam no resumo mensal; os demais leem só as vendas do intervalo,
+         pelo índice `(usuario_id, data)`.
+         
+         A resposta traz um `ETag` ligado à versão dos dados do usuário e aos filtros.
+         Enviando-o em `If-None-Match`, a API responde `304 Not Modified` sem recalcular
+         nada enquanto não houver nova importação.""",
          responses={
+             304: {
+                 "description": "Métricas inalteradas desde o ETag enviado em If-None-Match"
+             },
+             400: {
+                 "description": "Período inválido (start posterior a end)",
+                 "model": ErrorResponse
+             },
              401: {
                  "description": "Token de autenticação inválido",
                  "model": ErrorResponse
              }
          })
-def get_metrics(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    receita_total = db.query(func.sum(Venda.valor_total)).filter(Venda.usuario_id == current_user.id).scalar() or 0
-    ticket_medio = db.query(func.avg(Venda.valor_total)).filter(Venda.usuario_id == current_user.id).scalar() or 0
-    
-    produto_mais_vendido = db.query(Produto.nome, func.sum(Venda.quantidade).label('qtd'))\
-        .join(Venda).filter(Venda.usuario_id == current_user.id)\
-        .group_by(Produto.id).order_by(func.sum(Venda.quantidade).desc()).first()
-    
-    evolucao = db.query(func.strftime('%Y-%m', Venda.data).label('mes'), func.sum(Venda.valor_total))\
-        .filter(Venda.usuario_id == current_user.id)\
-        .group_by('mes').order_by('mes').all()
-    
-    top_produtos = db.query(
-        Produto.nome, 
-        func.sum(Venda.valor_total).label('receita'),
-        func.sum(Venda.quantidade).label('quantidade')
-    ).join(Venda).filter(Venda.usuario_id == current_user.id)\
-     .group_by(Produto.id).order_by(func.sum(Venda.valor_total).desc()).limit(5).all()
-    
-    vendas_categoria = db.query(
-        Produto.categoria,
-        func.sum(Venda.valor_total).label('receita'),
-        func.count(Venda.id).label('num_vendas')
-    ).join(Venda).filter(Venda.usuario_id == current_user.id)\
-     .group_by(Produto.categoria).all()
-    
-    total_vendas = db.query(func.count(Venda.id)).filter(Venda.usuario_id == current_user.id).scalar() or 0
-    produtos_unicos = db.query(func.count(func.distinct(Produto.id)))\
-        .join(Venda).filter(Venda.usuario_id == current_user.id).scalar() or 0
-    
-    return {
-        "receita_total": receita_total,
-        "ticket_medio": ticket_medio,
-        "produto_mais_vendido": produto_mais_vendido[0] if produto_mais_vendido else None,
-        "evolucao_mensal": [{"mes": m, "receita": v} for m, v in evolucao],
-        "top_produtos": [{"nome": nome, "receita": rec, "quantidade": qtd} for nome, rec, qtd in top_produtos],
-        "vendas_categoria": [{"categoria": cat, "receita": rec, "num_vendas": num} for cat, rec, num in vendas_categoria],
-        "total_vendas": total_vendas,
-        "produtos_unicos": produtos_unicos
-    }
+async def get_metrics(request: Request,
+                      start: Optional[date] = Query(None, description="Início do período (inclusive), YYYY-MM-DD"),
+                      end: Optional[date] = Query(None, description="Fim do período (inclusive), YYYY-MM-DD"),
+                      granularity: str = Query('month', regex='^(day|week|month|quarter)$',
+                                               description="Granularidade da evolução: day, week, month ou quarter"),
+                      db: AsyncSession = Depends(get_async_read_db), current_user: Usuario = Depends(get_current_user)):
+    _validar_periodo(start, end)
+    etag = _etag('metrics', current_user.id, current_user.versao_dados, granularity, start or '', end or '')
+    cabecalhos = {}
+
+    async def metricas():
+        versao, conteudo = await obter_metricas(db, current_user.id, current_user.versao_dados, start, end, granularity)
+        if versao != current_user.versao_dados:
+            # Réplica atrasada: o conteúdo leva o ETag da versão que ela tem
+            cabecalhos['ETag'] = _etag('metrics', current_user.id, versao, granularity, start or '', end or '')
+        return conteudo
+
+    return await _com_etag(request, etag, metricas, cabecalhos)
+
+@app.get("/metrics/cache",
+         response_model=CacheMetricasResponse,
+         tags=["Métricas"],
+         summary="Estatísticas do cache de métricas",
+         description="""Contadores do cache em memória do `/metrics` neste processo da API:
+         acertos, falhas, descartes por LRU, ocupação e taxa de acerto.""",
+         responses={
+             401: {
+                 "description": "Token de autenticação inválido",
+                 "model": ErrorResponse
+             }
+         })
+async def get_metrics_cache(current_user: Usuario = Depends(get_current_user)):
+    return estatisticas_cache()
 
 @app.get("/forecast",
          response_model=List[ForecastOut],
@@ -255,7 +421,18 @@ def get_metrics(db: Session = Depends(get_db), current_user: Usuario = Depends(g
          - Intervalo de confiança da previsão
          
          **Importante**: Execute '/run-ml' antes para gerar novas previsões.
-         Retorna apenas previsões para produtos que o usuário já vendeu.""",
+         Retorna apenas previsões para produtos que o usuário já vendeu, uma vez cada
+         (independente do número de vendas do produto).
+         
+         Filtros: `produto_id` (repetível) e `start`/`end` sobre `data_prevista`.
+         `fields` escolhe os campos da resposta (ex.: `fields=produto_id,data_prevista,qtd_prevista`).
+         
+         Paginação por cursor: a resposta é ordenada por `(data_prevista, produto_id)`; com
+         `limit`, o cabeçalho `X-Next-Cursor` traz o cursor da próxima página, a ser enviado
+         em `cursor`. Sem o cabeçalho, não há mais páginas.
+         
+         O `ETag` muda quando as previsões são regeradas, o usuário importa dados ou os
+         parâmetros mudam; com `If-None-Match` igual, a resposta é `304 Not Modified`.""",
          responses={
              200: {
                  "description": "Lista de previsões encontradas",
@@ -280,66 +457,84 @@ def get_metrics(db: Session = Depends(get_db), current_user: Usuario = Depends(g
                      }
                  }
              },
+             304: {
+                 "description": "Previsões inalteradas desde o ETag enviado em If-None-Match"
+             },
+             400: {
+                 "description": "Parâmetro inválido (campo desconhecido em fields, cursor ou período)",
+                 "model": ErrorResponse
+             },
              401: {
                  "description": "Token de autenticação inválido",
                  "model": ErrorResponse
              }
          })
-def get_forecast(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    forecasts = (
-        db.query(Forecast, Produto.nome.label("produto_nome"))
-          .join(Produto, Forecast.produto_id == Produto.id)
-          .join(Venda, Venda.produto_id == Produto.id)
-          .filter(Venda.usuario_id == current_user.id)
-          .all()
-    )
-    return [
-        {
-            "produto_id": f.Forecast.produto_id if hasattr(f, 'Forecast') else f[0].produto_id,
-            "produto_nome": (f.produto_nome if hasattr(f, 'produto_nome') else f[1]),
-            "data_prevista": (f.Forecast.data_prevista if hasattr(f, 'Forecast') else f[0].data_prevista),
-            "qtd_prevista": (f.Forecast.qtd_prevista if hasattr(f, 'Forecast') else f[0].qtd_prevista),
-            "intervalo_conf": (f.Forecast.intervalo_conf if hasattr(f, 'Forecast') else f[0].intervalo_conf)
-        }
-        for f in forecasts
-    ]
+async def get_forecast(request: Request,
+                       produto_id: Optional[List[int]] = Query(None, description="Só previsões destes produtos (repetível)"),
+                       start: Optional[date] = Query(None, description="data_prevista inicial (inclusive), YYYY-MM-DD"),
+                       end: Optional[date] = Query(None, description="data_prevista final (inclusive), YYYY-MM-DD"),
+                       fields: Optional[str] = Query(None, description="Campos da resposta, separados por vírgula (padrão: todos)"),
+                       limit: Optional[int] = Query(None, ge=1, le=FORECAST_LIMITE_MAX, description="Tamanho da página (padrão: sem limite)"),
+                       cursor: Optional[str] = Query(None, description="X-Next-Cursor da página anterior"),
+                       db: AsyncSession = Depends(get_async_read_db), current_user: Usuario = Depends(get_current_user)):
+    _validar_periodo(start, end)
+    try:
+        campos = campos_pedidos(fields)
+        if cursor is not None:
+            decodificar_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Depende das previsões geradas, de quais produtos o usuário vende e dos parâmetros
+    versoes = (current_user.versao_dados, current_user.versao_previsoes)
+    etag = _etag('forecast', current_user.id, *versoes, _assinatura(request))
+    cabecalhos = {}
+
+    async def previsoes():
+        na_leitura = await versoes_na_leitura(db, current_user.id, *versoes)
+        if na_leitura != versoes:
+            # Réplica atrasada: as linhas levam o ETag das versões que ela tem
+            cabecalhos['ETag'] = _etag('forecast', current_user.id, *na_leitura, _assinatura(request))
+        linhas, proximo = await listar_previsoes(db, current_user.id, campos, produto_id, start, end, cursor, limit)
+        if proximo:
+            cabecalhos['X-Next-Cursor'] = proximo
+        return linhas
+
+    return await _com_etag(request, etag, previsoes, cabecalhos)
 
 @app.post("/run-ml",
          response_model=MLResponse,
+         status_code=202,
          tags=["Machine Learning"],
          summary="Executar modelo de Machine Learning",
-         description="""Executa o algoritmo de Machine Learning para gerar previsões de demanda.
+         description="""Enfileira a geração das previsões de demanda do usuário autenticado.
          
          O processo:
-         1. Remove previsões antigas do banco de dados
-         2. Executa o script ML (ml/ml.py) via subprocess
-         3. O script analisa os dados de vendas e gera novas previsões
-         4. As previsões são salvas automaticamente no banco
+         1. O job roda no worker de jobs da API (o mesmo das importações), que já
+            tem o modelo (ml/ml.py) carregado: não há subprocesso por execução
+         2. O modelo analisa só as vendas desse usuário e gera novas previsões
+         3. As previsões do usuário são substituídas numa única transação; as dos
+            demais usuários não são tocadas
+         
+         A resposta traz o `job_id` imediatamente; acompanhe a etapa e o percentual
+         em `GET /run-ml/{job_id}`. Se o usuário já tem uma execução pendente ou em
+         andamento, ela é retornada em vez de enfileirar outra.
          
-         **Tempo estimado**: 30-60 segundos
          **Pré-requisito**: Ter dados de vendas importados
          
          Após a execução, use GET /forecast para visualizar os resultados.""",
          responses={
-             200: {
-                 "description": "Resultado da execução do ML",
+             202: {
+                 "description": "Execução do ML enfileirada",
                  "content": {
                      "application/json": {
-                         "examples": {
-                             "success": {
-                                 "summary": "Execução bem-sucedida",
-                                 "value": {
-                                     "status": "success",
-                                     "message": "ML executado com sucesso"
-                                 }
-                             },
-                             "error": {
-                                 "summary": "Erro na execução",
-                                 "value": {
-                                     "status": "error",
-                                     "message": "Erro: Dados insuficientes para treinamento"
-                                 }
-                             }
+                         "example": {
+                             "job_id": "9b1e4c2a7d3f4e5a8c6b0d1e2f3a4b5c",
+                             "status": "pendente",
+                             "mensagem": None,
+                             "etapa": None,
+                             "progresso": 0.0,
+                             "previsoes_geradas": 0
                          }
                      }
                  }
@@ -349,24 +544,36 @@ def get_forecast(db: Session = Depends(get_db), current_user: Usuario = Depends(
                  "model": ErrorResponse
              }
          })
-def run_ml_forecast(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    try:
-        db.query(Forecast).delete()
-        db.commit()
-        
-        import subprocess
-        import sys
-        import os
-        
-        ml_script = os.path.join(os.path.dirname(__file__), "..", "ml", "ml.py")
-        result = subprocess.run([sys.executable, ml_script], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return {"status": "success", "message": "ML executado com sucesso"}
-        else:
-            return {"status": "error", "message": f"Erro: {result.stderr}"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+def run_ml_forecast(current_user: Usuario = Depends(get_current_user)):
+    # Só as previsões do usuário são recalculadas (e substituídas), com as vendas dele
+    return submeter_job('ml', current_user.id, executar_ml, current_user.id, unico=True)
+
+@app.get("/run-ml/{job_id}",
+         response_model=MLResponse,
+         tags=["Machine Learning"],
+         summary="Consultar andamento de uma execução do ML",
+         description="""Retorna o andamento de um job criado por `POST /run-ml`:
+         - Status (pendente, processando, concluido, erro)
+         - Etapa atual (receita, produtos, gravando, concluido) e percentual
+         - Número de previsões gravadas, ao concluir
+         - Mensagem de erro, se a execução falhar
+         
+         Só é possível consultar jobs do próprio usuário.""",
+         responses={
+             404: {
+                 "description": "Job não encontrado",
+                 "model": ErrorResponse
+             },
+             401: {
+                 "description": "Token de autenticação inválido",
+                 "model": ErrorResponse
+             }
+         })
+def get_ml_status(job_id: str, current_user: Usuario = Depends(get_current_user)):
+    job = obter_job(job_id, current_user.id, tipo='ml')
+    if job is None:
+        raise HTTPException(status_code=404, detail="Execução do ML não encontrada")
+    return job
 
 @app.on_event("startup")
 def create_admin():
@@ -375,4 +582,8 @@ def create_admin():
         user = Usuario(email="admin@admin.com", senha_hash=get_password_hash("admin"))
         db.add(user)
         db.commit()
-    db.close()
\ No newline at end of file
+    db.close()
+
+@app.on_event("shutdown")
+async def close_connections():
+    await fechar_engines_async()
@@ -0,0 +1,194 @@
+"""
+Cálculo das métricas de vendas (KPIs do /metrics) e cache por usuário
+"""
+from collections import OrderedDict
+from datetime import date, timedelta
+import os
+import threading
+from sqlalchemy import func, select
+from .database import LEITURA_EM_REPLICA
+from .distribuicao import contar_faixas, histograma, percentis
+from .models import Usuario, Produto, Venda, VendaMensal, VendaTicket
+from .importer import chave_mes
+
+# Entradas de métricas em cache; ao passar do limite sai o usado há mais tempo (LRU)
+METRICAS_CACHE_MAX = int(os.getenv('METRICAS_CACHE_MAX', '1000'))
+
+# (usuario_id, inicio, fim, granularidade) -> (versao_dados, métricas). Uma
+# entrada por usuário e filtro: a versão muda a cada importação, e a entrada
+# da versão anterior é substituída.
+_cache = OrderedDict()
+_lock = threading.Lock()
+_contadores = {'acertos': 0, 'falhas': 0, 'descartes': 0}
+
+GRANULARIDADES = ('day', 'week', 'month', 'quarter')
+
+def _formatar_mes(mes):
+    return f"{mes // 100:04d}-{mes % 100:02d}"
+
+def _formatar_trimestre(mes):
+    return f"{mes // 100:04d}-T{(mes % 100 - 1) // 3 + 1}"
+
+def _formatar_semana(data):
+    """Semana ISO, identificada pela data da segunda-feira"""
+    return (data - timedelta(days=data.weekday())).isoformat()
+
+ROTULOS = {
+    'day': lambda data: data.isoformat(),
+    'week': _formatar_semana,
+    'month': _formatar_mes,
+    'quarter': _formatar_trimestre,
+}
+
+def _meses_inteiros(inicio, fim):
+    """Se o período começa e termina em limites de mês (e pode sair do resumo mensal)"""
+    ultimo_dia = fim is None or fim == date.max or (fim + timedelta(days=1)).day == 1
+    return (inicio is None or inicio.day == 1) and ultimo_dia
+
+async def calcular_metricas(db, usuario_id, inicio=None, fim=None, granularidade='month'):
+    """
+    KPIs do usuário em três consultas: uma agrupada por produto, de onde
+    saem totais, ranking e categorias, outra agrupada por período, para a
+    evolução da receita, e a distribuição do valor das vendas (percentis e
+    histograma do ticket).
+
+    Sem filtro, ou com um período de meses inteiros, elas leem os resumos
+    mensais (vendas_mensais e vendas_ticket) e o custo depende de meses x
+    produtos (ou faixas de valor), não do número de vendas. Um período que
+    corta meses lê a tabela vendas pelo índice (usuario_id, data), só no
+    intervalo pedido. A evolução diária e
+    semanal agrupa vendas por data; semanas e trimestres são somados aqui
+    a partir dos dias e meses, que já vêm ordenados.
+    """
+    resumo = _meses_inteiros(inicio, fim)
+
+    do_resumo = [VendaMensal.usuario_id == usuario_id]
+    do_ticket = [VendaTicket.usuario_id == usuario_id]
+    das_vendas = [Venda.usuario_id == usuario_id]
+    if inicio is not None:
+        do_resumo.append(VendaMensal.mes >= chave_mes(inicio))
+        do_ticket.append(VendaTicket.mes >= chave_mes(inicio))
+        das_vendas.append(Venda.data >= inicio)
+    if fim is not None:
+        do_resumo.append(VendaMensal.mes <= chave_mes(fim))
+        do_ticket.append(VendaTicket.mes <= chave_mes(fim))
+        das_vendas.append(Venda.data <= fim)
+
+    if resumo:
+        consulta_produtos = select(
+            Produto.nome,
+            Produto.categoria,
+            func.sum(VendaMensal.receita),
+            func.sum(VendaMensal.quantidade),
+            func.sum(VendaMensal.num_vendas),
+        ).join_from(VendaMensal, Produto).where(*do_resumo)
+    else:
+        consulta_produtos = select(
+            Produto.nome,
+            Produto.categoria,
+            func.sum(Venda.valor_total),
+            func.sum(Venda.quantidade),
+            func.count(Venda.id),
+        ).join_from(Venda, Produto).where(*das_vendas)
+    por_produto = (await db.execute(consulta_produtos.group_by(Produto.id))).all()
+
+    if granularidade in ('day', 'week'):
+        periodo, receita, filtro = Venda.data, func.sum(Venda.valor_total), das_vendas
+    elif resumo:
+        periodo, receita, filtro = VendaMensal.mes, func.sum(VendaMensal.receita), do_resumo
+    else:
+        periodo, receita, filtro = Venda.mes, func.sum(Venda.valor_total), das_vendas
+    por_periodo = (await db.execute(
+        select(periodo, receita).where(*filtro).group_by(periodo).order_by(periodo)
+    )).all()
+
+    if resumo:
+        faixas = (await db.execute(
+            select(VendaTicket.faixa, func.sum(VendaTicket.num_vendas))
+            .where(*do_ticket).group_by(VendaTicket.faixa).order_by(VendaTicket.faixa)
+        )).all()
+    else:
+        faixas = contar_faixas((await db.execute(select(Venda.valor_total).where(*das_vendas))).scalars())
+
+    rotulo = ROTULOS[granularidade]
+    evolucao = []
+    for valor, rec in por_periodo:
+        chave = rotulo(valor)
+        if evolucao and evolucao[-1]["mes"] == chave:
+            evolucao[-1]["receita"] += rec
+        else:
+            evolucao.append({"mes": chave, "receita": rec})
+
+    receita_total = sum(rec for _, _, rec, _, _ in por_produto)
+    total_vendas = sum(num for _, _, _, _, num in por_produto)
+
+    categorias = {}
+    for _, categoria, rec, _, num in por_produto:
+        acumulado = categorias.setdefault(categoria, [0.0, 0])
+        acumulado[0] += rec
+        acumulado[1] += num
+
+    mais_vendido = max(por_produto, key=lambda p: p[3], default=None)
+    top_produtos = sorted(por_produto, key=lambda p: p[2], reverse=True)[:5]
+
+    return {
+        "receita_total": receita_total,
+        "ticket_medio": receita_total / total_vendas if total_vendas else 0,
+        "ticket_percentis": percentis(faixas),
+        "histograma_ticket": histograma(faixas),
+        "produto_mais_vendido": mais_vendido[0] if mais_vendido else None,
+        "granularidade": granularidade,
+        "evolucao_mensal": evolucao,
+        "top_produtos": [{"nome": nome, "receita": rec, "quantidade": qtd} for nome, _, rec, qtd, _ in top_produtos],
+        "vendas_categoria": [
+            {"categoria": cat, "receita": rec, "num_vendas": num}
+            for cat, (rec, num) in sorted(categorias.items(), key=lambda c: (c[0] is not None, c[0] or ''))
+        ],
+        "total_vendas": total_vendas,
+        "produtos_unicos": len(por_produto),
+    }
+
+async def obter_metricas(db, usuario_id, versao_dados, inicio=None, fim=None, granularidade='month', replica=None):
+    """
+    calcular_metricas com cache em memória. A entrada só vale para a
+    versão dos dados em que foi calculada (usuarios.versao_dados), então
+    uma importação invalida o cache de todos os processos da API.
+
+    Lendo de uma réplica, a versão é lida na mesma sessão das agregações: se
+    a réplica ainda não tem a importação mais recente, o resultado fica
+    associado à versão que ela enxerga, não à pedida.
+    Retorna (versão dos dados do resultado, métricas).
+    """
+    chave = (usuario_id, inicio, fim, granularidade)
+    with _lock:
+        entrada = _cache.get(chave)
+        if entrada is not None and entrada[0] == versao_dados:
+            _cache.move_to_end(chave)
+            _contadores['acertos'] += 1
+            return entrada
+        _contadores['falhas'] += 1
+
+    versao = versao_dados
+    if LEITURA_EM_REPLICA if replica is None else replica:
+        na_replica = (await db.execute(select(Usuario.versao_dados).where(Usuario.id == usuario_id))).scalar()
+        versao = min(versao_dados, na_replica or 0)
+    metricas = await calcular_metricas(db, usuario_id, inicio, fim, granularidade)
+
+    with _lock:
+        _cache[chave] = (versao, metricas)
+        _cache.move_to_end(chave)
+        while len(_cache) > METRICAS_CACHE_MAX:
+            _cache.popitem(last=False)
+            _contadores['descartes'] += 1
+    return versao, metricas
+
+def estatisticas_cache():
+    """Contadores do cache de métricas, para monitoramento"""
+    with _lock:
+        consultas = _contadores['acertos'] + _contadores['falhas']
+        return {
+            **_contadores,
+            'entradas': len(_cache),
+            'capacidade': METRICAS_CACHE_MAX,
+            'taxa_acerto': round(_contadores['acertos'] / consultas, 4) if consultas else 0.0,
+        }
@@ -0,0 +1,183 @@
+"""
+Migrações do esquema do banco.
+
+Cada migração é aplicada uma única vez e registrada na tabela
+schema_migrations. Os passos são idempotentes (só criam o que falta),
+então funcionam tanto num banco novo quanto num banco criado pelo antigo
+Base.metadata.create_all, sem precisar recriá-lo.
+
+Uso manual: python -m backend.migrations
+"""
+from collections import Counter
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, extract, func, inspect, literal_column, select, text
+from datetime import datetime
+from .distribuicao import faixa_valor
+from .models import Base, Usuario, Produto, Venda, VendaMensal, VendaTicket, Forecast
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('versao', Integer, primary_key=True),
+    Column('descricao', String, nullable=False),
+    Column('aplicada_em', DateTime, default=datetime.utcnow),
+)
+
+def _criar_tabelas(conn):
+    """Cria as tabelas que ainda não existem, já com as definições atuais dos modelos"""
+    Base.metadata.create_all(bind=conn, checkfirst=True)
+
+def _criar_indices(conn, tabela):
+    inspetor = inspect(conn)
+    existentes = {indice['name'] for indice in inspetor.get_indexes(tabela.name)}
+    colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+    for indice in tabela.indexes:
+        # Índices sobre colunas ainda não criadas ficam para a migração que as adiciona
+        if indice.name not in existentes and all(c.name in colunas for c in indice.columns):
+            indice.create(bind=conn)
+
+def _adicionar_coluna(conn, coluna):
+    """ALTER TABLE ... ADD COLUMN, se a coluna ainda não existir"""
+    tabela = coluna.table.name
+    if coluna.name not in {c['name'] for c in inspect(conn).get_columns(tabela)}:
+        tipo = coluna.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna.name} {tipo}"))
+
+def _remover_indices(conn, tabela, nomes):
+    """DROP INDEX dos índices que existirem (substituídos por outros no modelo)"""
+    existentes = {indice['name'] for indice in inspect(conn).get_indexes(tabela.name)}
+    for nome in nomes:
+        if nome in existentes:
+            conn.execute(text(f"DROP INDEX {nome}"))
+
+def _expressao_mes(data):
+    """yyyymm a partir de uma coluna de data, em SQL portável (SQLite e Postgres)"""
+    # Literal (não parâmetro) para o Postgres reconhecer a mesma expressão no GROUP BY
+    return extract('year', data) * literal_column('100') + extract('month', data)
+
+def _deduplicar_produtos(conn):
+    """Mantém o produto de menor id para cada nome e reaponta vendas e previsões para ele"""
+    produtos = Produto.__table__
+    repetidos = conn.execute(
+        select(produtos.c.nome, func.min(produtos.c.id))
+        .group_by(produtos.c.nome)
+        .having(func.count() > 1)
+    ).all()
+    for nome, manter in repetidos:
+        descartar = select(produtos.c.id).where(produtos.c.nome == nome, produtos.c.id != manter)
+        for tabela in (Venda.__table__, Forecast.__table__):
+            conn.execute(tabela.update().where(tabela.c.produto_id.in_(descartar)).values(produto_id=manter))
+        conn.execute(produtos.delete().where(produtos.c.nome == nome, produtos.c.id != manter))
+
+def _m001_estrutura_inicial(conn):
+    _criar_tabelas(conn)
+
+def _m002_indices(conn):
+    _deduplicar_produtos(conn)
+    for modelo in (Produto, Venda, Forecast):
+        _criar_indices(conn, modelo.__table__)
+
+def _recalcular_resumo_mensal(conn):
+    """Reconstrói vendas_mensais a partir de todas as vendas"""
+    resumo = VendaMensal.__table__
+    vendas = Venda.__table__
+    mes = _expressao_mes(vendas.c.data)
+    conn.execute(resumo.delete())
+    conn.execute(resumo.insert().from_select(
+        ['usuario_id', 'produto_id', 'mes', 'receita', 'quantidade', 'num_vendas'],
+        select(
+            vendas.c.usuario_id, vendas.c.produto_id, mes,
+            func.coalesce(func.sum(vendas.c.valor_total), 0),
+            func.coalesce(func.sum(vendas.c.quantidade), 0),
+            func.count(),
+        )
+        .where(vendas.c.usuario_id.isnot(None), vendas.c.produto_id.isnot(None))
+        .group_by(vendas.c.usuario_id, vendas.c.produto_id, mes)
+    ))
+
+def _m003_resumo_mensal(conn):
+    _criar_tabelas(conn)
+    _recalcular_resumo_mensal(conn)
+
+def _m004_mes_das_vendas(conn):
+    vendas = Venda.__table__
+    _adicionar_coluna(conn, vendas.c.mes)
+    conn.execute(vendas.update().where(vendas.c.mes.is_(None)).values(mes=_expressao_mes(vendas.c.data)))
+    _criar_indices(conn, vendas)
+
+def _m005_versao_dos_dados(conn):
+    usuarios = Usuario.__table__
+    _adicionar_coluna(conn, usuarios.c.versao_dados)
+    conn.execute(usuarios.update().where(usuarios.c.versao_dados.is_(None)).values(versao_dados=0))
+
+def _m006_versao_das_previsoes(conn):
+    usuarios = Usuario.__table__
+    _adicionar_coluna(conn, usuarios.c.versao_previsoes)
+    conn.execute(usuarios.update().where(usuarios.c.versao_previsoes.is_(None)).values(versao_previsoes=0))
+
+def _recalcular_distribuicao_ticket(conn):
+    """Reconstrói vendas_ticket a partir de todas as vendas (a faixa é calculada em Python)"""
+    distribuicao = VendaTicket.__table__
+    vendas = Venda.__table__
+    contagens = Counter()
+    linhas = conn.execution_options(stream_results=True).execute(
+        select(vendas.c.usuario_id, vendas.c.mes, vendas.c.valor_total)
+        .where(vendas.c.usuario_id.isnot(None), vendas.c.mes.isnot(None))
+    )
+    for usuario_id, mes, valor_total in linhas:
+        contagens[(usuario_id, mes, faixa_valor(valor_total or 0))] += 1
+    conn.execute(distribuicao.delete())
+    if contagens:
+        conn.execute(distribuicao.insert(), [
+            {'usuario_id': usuario_id, 'mes': mes, 'faixa': indice, 'num_vendas': num_vendas}
+            for (usuario_id, mes, indice), num_vendas in contagens.items()
+        ])
+
+def _m007_distribuicao_ticket(conn):
+    _criar_tabelas(conn)
+    _recalcular_distribuicao_ticket(conn)
+
+def _m008_indice_forecast_data(conn):
+    _criar_indices(conn, Forecast.__table__)
+
+def _m009_previsoes_por_usuario(conn):
+    forecast = Forecast.__table__
+    usuarios = Usuario.__table__
+    _adicionar_coluna(conn, forecast.c.usuario_id)
+    _remover_indices(conn, forecast, ('ix_forecast_produto_data', 'ix_forecast_data_produto'))
+    _criar_indices(conn, forecast)
+    # Previsões antigas foram calculadas com as vendas de todos os usuários e não
+    # têm dono: saem, e cada usuário gera as suas no próximo /run-ml
+    conn.execute(forecast.delete().where(forecast.c.usuario_id.is_(None)))
+    conn.execute(usuarios.update().values(versao_previsoes=usuarios.c.versao_previsoes + 1))
+
+MIGRACOES = [
+    (1, "Estrutura inicial", _m001_estrutura_inicial),
+    (2, "Índices de vendas e forecast; produtos.nome único", _m002_indices),
+    (3, "Resumo mensal de vendas (vendas_mensais)", _m003_resumo_mensal),
+    (4, "Coluna vendas.mes (yyyymm) e índice (usuario_id, mes)", _m004_mes_das_vendas),
+    (5, "Coluna usuarios.versao_dados", _m005_versao_dos_dados),
+    (6, "Coluna usuarios.versao_previsoes", _m006_versao_das_previsoes),
+    (7, "Distribuição do valor das vendas (vendas_ticket)", _m007_distribuicao_ticket),
+    (8, "Índice forecast (data_prevista, produto_id)", _m008_indice_forecast_data),
+    (9, "Coluna forecast.usuario_id e índices por usuário", _m009_previsoes_por_usuario),
+]
+
+def aplicar_migracoes(engine):
+    """Aplica, em ordem, as migrações ainda não registradas no banco"""
+    _metadata.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        aplicadas = {versao for (versao,) in conn.execute(select(schema_migrations.c.versao))}
+
+    for versao, descricao, migracao in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        print(f"🔧 Aplicando migração {versao:03d}: {descricao}")
+        # Uma transação por migração: em caso de erro o banco fica na versão anterior
+        with engine.begin() as conn:
+            migracao(conn)
+            conn.execute(schema_migrations.insert().values(versao=versao, descricao=descricao))
+
+if __name__ == "__main__":
+    from .database import engine
+    aplicar_migracoes(engine)
+    print("✅ Banco atualizado")
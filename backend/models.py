@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
 
 Base = declarative_base()
 
@@ -9,6 +10,8 @@ class Usuario(Base):
     id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, nullable=False)
     senha_hash = Column(String, nullable=False)
+    versao_dados = Column(Integer, nullable=False, default=0)  # incrementada a cada importação
+    versao_previsoes = Column(Integer, nullable=False, default=0)  # incrementada a cada geração de previsões
     vendas = relationship('Venda', back_populates='usuario')
 
 class Produto(Base):
@@ -18,6 +21,7 @@ class Produto(Base):
     categoria = Column(String)
     preco = Column(Float)
     vendas = relationship('Venda', back_populates='produto')
+    __table_args__ = (Index('ux_produtos_nome', 'nome', unique=True),)
 
 class Venda(Base):
     __tablename__ = 'vendas'
@@ -27,14 +31,64 @@ class Venda(Base):
     usuario_id = Column(Integer, ForeignKey('usuarios.id'))
     quantidade = Column(Integer)
     valor_total = Column(Float)
+    mes = Column(Integer)  # yyyymm, chave dos agrupamentos mensais
     produto = relationship('Produto', back_populates='vendas')
     usuario = relationship('Usuario', back_populates='vendas')
+    __table_args__ = (
+        Index('ix_vendas_usuario_data', 'usuario_id', 'data'),
+        Index('ix_vendas_usuario_produto', 'usuario_id', 'produto_id'),
+        Index('ix_vendas_usuario_mes', 'usuario_id', 'mes'),
+    )
+
+class VendaMensal(Base):
+    """Totais de vendas por usuário, produto e mês, mantidos pela importação"""
+    __tablename__ = 'vendas_mensais'
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    produto_id = Column(Integer, ForeignKey('produtos.id'), primary_key=True)
+    mes = Column(Integer, primary_key=True)  # yyyymm
+    receita = Column(Float, nullable=False, default=0)
+    quantidade = Column(Integer, nullable=False, default=0)
+    num_vendas = Column(Integer, nullable=False, default=0)
+    produto = relationship('Produto')
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class VendaTicket(Base):
+    """Vendas por usuário, mês e faixa de valor (backend/distribuicao.py), mantidas pela importação"""
+    __tablename__ = 'vendas_ticket'
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    mes = Column(Integer, primary_key=True)  # yyyymm
+    faixa = Column(Integer, primary_key=True)
+    num_vendas = Column(Integer, nullable=False, default=0)
+    __table_args__ = {'sqlite_with_rowid': False}
 
 class Forecast(Base):
     __tablename__ = 'forecast'
     id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'))  # dono da previsão (gerada só com as vendas dele)
     produto_id = Column(Integer, ForeignKey('produtos.id'))
     data_prevista = Column(Date)
     qtd_prevista = Column(Float)  # Agora representa RECEITA prevista
     intervalo_conf = Column(String)
     produto = relationship('Produto')
+    __table_args__ = (
+        Index('ix_forecast_usuario_data_produto', 'usuario_id', 'data_prevista', 'produto_id'),
+        Index('ix_forecast_usuario_produto_data', 'usuario_id', 'produto_id', 'data_prevista'),
+    )
+
+class Importacao(Base):
+    """Arquivos já importados, identificados pelo SHA-256 do conteúdo"""
+    __tablename__ = 'importacoes'
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    arquivo_hash = Column(String(64), nullable=False)
+    nome_arquivo = Column(String)
+    linhas = Column(Integer)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (UniqueConstraint('usuario_id', 'arquivo_hash'),)
+
+class VendaHash(Base):
+    """Impressão digital de cada venda importada, para descartar linhas repetidas"""
+    __tablename__ = 'vendas_hash'
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    hash = Column(String(32), primary_key=True)
+    __table_args__ = {'sqlite_with_rowid': False}
@@ -0,0 +1,97 @@
+"""
+Consulta das previsões do /forecast: filtros, projeção de campos e paginação por cursor
+"""
+import base64
+import binascii
+import os
+from datetime import date
+from sqlalchemy import and_, or_, select
+from .database import LEITURA_EM_REPLICA
+from .models import Produto, Forecast, Usuario
+
+# Campos de ForecastOut, na ordem da resposta
+CAMPOS_PREVISAO = ('produto_id', 'produto_nome', 'data_prevista', 'qtd_prevista', 'intervalo_conf')
+
+# Maior página aceita em ?limit=
+FORECAST_LIMITE_MAX = int(os.getenv('FORECAST_LIMITE_MAX', '5000'))
+
+def codificar_cursor(data_prevista, produto_id):
+    """Cursor opaco com a chave (data_prevista, produto_id) da última previsão da página"""
+    return base64.urlsafe_b64encode(f"{data_prevista.isoformat()},{produto_id}".encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor):
+    """Chave do cursor; ValueError se ele não foi gerado por codificar_cursor"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data_prevista, produto_id = texto.split(',')
+        return date.fromisoformat(data_prevista), int(produto_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("cursor inválido")
+
+def campos_pedidos(fields):
+    """Campos de ?fields= (separados por vírgula), na ordem de CAMPOS_PREVISAO; todos se vazio"""
+    if not fields:
+        return CAMPOS_PREVISAO
+    pedidos = {campo.strip() for campo in fields.split(',') if campo.strip()}
+    desconhecidos = pedidos - set(CAMPOS_PREVISAO)
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}. Disponíveis: {', '.join(CAMPOS_PREVISAO)}")
+    return tuple(campo for campo in CAMPOS_PREVISAO if campo in pedidos)
+
+async def versoes_na_leitura(db, usuario_id, versao_dados, versao_previsoes, replica=None):
+    """
+    Versões (dados, previsões) que a sessão de leitura enxerga, para o ETag.
+    Numa réplica atrasada são as que ela tem, não as do banco de escrita;
+    lidas antes das previsões, nunca são mais novas que as linhas lidas.
+    """
+    if not (LEITURA_EM_REPLICA if replica is None else replica):
+        return versao_dados, versao_previsoes
+    na_replica = (await db.execute(
+        select(Usuario.versao_dados, Usuario.versao_previsoes).where(Usuario.id == usuario_id)
+    )).one_or_none() or (0, 0)
+    return min(versao_dados, na_replica[0] or 0), min(versao_previsoes, na_replica[1] or 0)
+
+async def listar_previsoes(db, usuario_id, campos=CAMPOS_PREVISAO, produtos=None, inicio=None, fim=None,
+                           cursor=None, limite=None):
+    """
+    Previsões do usuário (geradas só com as vendas dele, uma por produto e
+    data), ordenadas por (data_prevista, produto_id). A página seguinte começa
+    depois da chave do cursor (keyset), então o custo não cresce com o número
+    de páginas já lidas; os índices de forecast começam por usuario_id e
+    atendem os filtros de produto e data.
+    Retorna (linhas com os campos pedidos, cursor da próxima página ou None).
+    """
+    colunas = {
+        'produto_id': Forecast.produto_id,
+        'produto_nome': Produto.nome.label('produto_nome'),
+        'data_prevista': Forecast.data_prevista,
+        'qtd_prevista': Forecast.qtd_prevista,
+        'intervalo_conf': Forecast.intervalo_conf,
+    }
+    # A chave do cursor é sempre lida, mesmo fora da projeção
+    selecionados = [c for c in CAMPOS_PREVISAO if c in campos or c in ('data_prevista', 'produto_id')]
+    consulta = select(*(colunas[c] for c in selecionados)).where(Forecast.usuario_id == usuario_id)
+    if 'produto_nome' in campos:
+        consulta = consulta.join(Produto, Forecast.produto_id == Produto.id)
+    if produtos:
+        consulta = consulta.where(Forecast.produto_id.in_(produtos))
+    if inicio is not None:
+        consulta = consulta.where(Forecast.data_prevista >= inicio)
+    if fim is not None:
+        consulta = consulta.where(Forecast.data_prevista <= fim)
+    if cursor is not None:
+        data_cursor, produto_cursor = decodificar_cursor(cursor)
+        consulta = consulta.where(or_(
+            Forecast.data_prevista > data_cursor,
+            and_(Forecast.data_prevista == data_cursor, Forecast.produto_id > produto_cursor),
+        ))
+    consulta = consulta.order_by(Forecast.data_prevista, Forecast.produto_id)
+    if limite is not None:
+        consulta = consulta.limit(limite + 1)
+
+    linhas = (await db.execute(consulta)).mappings().all()
+    proximo = None
+    if limite is not None and len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = codificar_cursor(linhas[-1]['data_prevista'], linhas[-1]['produto_id'])
+    return [{campo: linha[campo] for campo in campos} for linha in linhas], proximo
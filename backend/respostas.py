@@ -0,0 +1,59 @@
+"""
+Serialização e compressão das respostas da API
+
+RespostaJSON serializa com orjson quando o pacote está instalado (opcional)
+e com o json da biblioteca padrão caso contrário. Endpoints que montam o
+próprio conteúdo (/metrics, /forecast) a retornam diretamente, o que
+dispensa a validação pelo response_model (pydantic) e o jsonable_encoder;
+o response_model continua documentando o formato no OpenAPI.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import os
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Respostas menores que isso não são comprimidas (o ganho não paga o custo)
+COMPRESSAO_MIN_BYTES = int(os.getenv('COMPRESSAO_MIN_BYTES', '1024'))
+# Nível do gzip (1-9) e qualidade do brotli (0-11)
+COMPRESSAO_NIVEL_GZIP = int(os.getenv('COMPRESSAO_NIVEL_GZIP', '6'))
+COMPRESSAO_QUALIDADE_BROTLI = int(os.getenv('COMPRESSAO_QUALIDADE_BROTLI', '4'))
+
+def _padrao(valor):
+    """Tipos que saem do banco e não são JSON nativos"""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+def serializar_json(conteudo):
+    """JSON compacto em bytes, com orjson quando disponível"""
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao)
+    return json.dumps(conteudo, default=_padrao, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class RespostaJSON(JSONResponse):
+    def render(self, content):
+        return serializar_json(content)
+
+def adicionar_compressao(app):
+    """
+    Comprime respostas a partir de COMPRESSAO_MIN_BYTES: brotli quando o
+    pacote brotli-asgi está instalado (com gzip para clientes sem suporte
+    a br), senão gzip.
+    """
+    try:
+        from brotli_asgi import BrotliMiddleware
+    except ImportError:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSAO_MIN_BYTES, compresslevel=COMPRESSAO_NIVEL_GZIP)
+        return 'gzip'
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSAO_MIN_BYTES,
+                       quality=COMPRESSAO_QUALIDADE_BROTLI, gzip_fallback=True)
+    return 'br'
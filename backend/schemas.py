@@ -16,12 +16,24 @@ class MessageResponse(BaseModel):
     message: str = Field(..., example="Usuário criado com sucesso")
     email: Optional[str] = Field(None, example="novo@exemplo.com")
 
+class RejeicaoLinha(BaseModel):
+    linha: int = Field(..., example=42, description="Número da linha no arquivo (registro, no Parquet)")
+    motivo: str = Field(..., example="quantidade inválida: 'abc'", description="Motivo da rejeição")
+
 class ImportResponse(BaseModel):
-    status: str = Field(..., example="Importação realizada")
+    job_id: str = Field(..., example="3f2c9a7e1b8d4c6f9e0a1b2c3d4e5f60", description="Identificador do job de importação")
+    status: str = Field(..., example="processando", description="Status do job: 'pendente', 'processando', 'concluido' ou 'erro'")
+    mensagem: Optional[str] = Field(None, example="Importação realizada", description="Mensagem final ou detalhe do erro")
+    linhas_processadas: int = Field(0, example=289, description="Vendas gravadas até o momento")
+    linhas_rejeitadas: int = Field(0, example=0, description="Linhas descartadas por erro de validação")
+    linhas_duplicadas: int = Field(0, example=0, description="Linhas ignoradas por já terem sido importadas")
+    tempo_segundos: float = Field(0.0, example=0.042, description="Duração da importação em segundos")
+    linhas_por_segundo: float = Field(0.0, example=6880.9, description="Vazão da importação")
+    rejeicoes: List[RejeicaoLinha] = Field(default_factory=list, description="Linhas rejeitadas e motivos (limitado a IMPORT_MAX_REJEICOES)")
 
 class MetricsMonth(BaseModel):
-    mes: str = Field(..., example="2024-01", description="Mês no formato YYYY-MM")
-    receita: float = Field(..., example=5000.0, description="Receita do mês")
+    mes: str = Field(..., example="2024-01", description="Período: YYYY-MM-DD (dia ou segunda-feira da semana), YYYY-MM (mês) ou YYYY-Tn (trimestre)")
+    receita: float = Field(..., example=5000.0, description="Receita do período")
 
 class TopProduto(BaseModel):
     nome: str = Field(..., example="Notebook Dell")
@@ -33,11 +45,24 @@ class VendasCategoria(BaseModel):
     receita: float = Field(..., example=5000.0)
     num_vendas: int = Field(..., example=1)
 
+class TicketPercentis(BaseModel):
+    p50: Optional[float] = Field(None, example=180.0, description="Mediana do valor das vendas")
+    p90: Optional[float] = Field(None, example=1450.0, description="Percentil 90 do valor das vendas")
+    p99: Optional[float] = Field(None, example=6200.0, description="Percentil 99 do valor das vendas")
+
+class FaixaHistograma(BaseModel):
+    de: float = Field(..., example=100.0, description="Limite inferior da faixa de valor (inclusive)")
+    ate: float = Field(..., example=200.0, description="Limite superior da faixa de valor")
+    num_vendas: int = Field(..., example=42, description="Vendas com valor na faixa")
+
 class MetricsResponse(BaseModel):
     receita_total: float = Field(..., example=12500.5, description="Receita total do usuário")
     ticket_medio: float = Field(..., example=250.01, description="Valor médio por venda")
+    ticket_percentis: TicketPercentis = Field(default_factory=TicketPercentis, description="Percentis do valor das vendas (erro relativo de até 1%)")
+    histograma_ticket: List[FaixaHistograma] = Field(default_factory=list, description="Vendas por faixa de valor (limites 1-2-5)")
     produto_mais_vendido: Optional[str] = Field(None, example="Mouse Logitech", description="Nome do produto com mais vendas")
-    evolucao_mensal: List[MetricsMonth] = Field(default_factory=list, description="Evolução da receita por mês")
+    granularidade: str = Field("month", example="month", description="Granularidade da evolução: 'day', 'week', 'month' ou 'quarter'")
+    evolucao_mensal: List[MetricsMonth] = Field(default_factory=list, description="Evolução da receita por período da granularidade pedida")
     top_produtos: List[TopProduto] = Field(default_factory=list, description="Top 5 produtos por receita")
     vendas_categoria: List[VendasCategoria] = Field(default_factory=list, description="Vendas agrupadas por categoria")
     total_vendas: int = Field(..., example=9, description="Total de vendas do usuário")
@@ -48,7 +73,15 @@ class MetricsResponse(BaseModel):
             "example": {
                 "receita_total": 12500.5,
                 "ticket_medio": 250.01,
+                "ticket_percentis": {"p50": 180.0, "p90": 1450.0, "p99": 6200.0},
+                "histograma_ticket": [
+                    {"de": 100.0, "ate": 200.0, "num_vendas": 5},
+                    {"de": 200.0, "ate": 500.0, "num_vendas": 3},
+                    {"de": 500.0, "ate": 1000.0, "num_vendas": 0},
+                    {"de": 1000.0, "ate": 2000.0, "num_vendas": 1}
+                ],
                 "produto_mais_vendido": "Mouse Logitech",
+                "granularidade": "month",
                 "evolucao_mensal": [
                     {"mes": "2024-01", "receita": 5000.0},
                     {"mes": "2024-02", "receita": 7500.5}
@@ -66,6 +99,14 @@ class MetricsResponse(BaseModel):
             }
         }
 
+class CacheMetricasResponse(BaseModel):
+    acertos: int = Field(..., example=120, description="Requisições atendidas pelo cache")
+    falhas: int = Field(..., example=8, description="Requisições que recalcularam as métricas")
+    descartes: int = Field(..., example=0, description="Entradas removidas por falta de espaço (LRU)")
+    entradas: int = Field(..., example=5, description="Combinações de usuário e filtro com métricas em cache")
+    capacidade: int = Field(..., example=1000, description="Máximo de entradas (METRICAS_CACHE_MAX)")
+    taxa_acerto: float = Field(..., example=0.9375, description="acertos / (acertos + falhas)")
+
 class ForecastOut(BaseModel):
     produto_id: int = Field(..., example=1)
     produto_nome: Optional[str] = Field(None, example="Notebook Dell")
@@ -85,28 +126,12 @@ class ForecastOut(BaseModel):
         }
 
 class MLResponse(BaseModel):
-    status: str = Field(..., example="success", description="Status da execução: 'success' ou 'error'")
-    message: str = Field(..., example="ML executado com sucesso", description="Mensagem detalhada do resultado")
-
-    class Config:
-        schema_extra = {
-            "examples": {
-                "success": {
-                    "summary": "Execução bem-sucedida",
-                    "value": {
-                        "status": "success",
-                        "message": "ML executado com sucesso"
-                    }
-                },
-                "error": {
-                    "summary": "Erro na execução",
-                    "value": {
-                        "status": "error",
-                        "message": "Erro: ModuleNotFoundError: No module named 'numpy'"
-                    }
-                }
-            }
-        }
+    job_id: str = Field(..., example="9b1e4c2a7d3f4e5a8c6b0d1e2f3a4b5c", description="Identificador do job de ML")
+    status: str = Field(..., example="processando", description="Status do job: 'pendente', 'processando', 'concluido' ou 'erro'")
+    mensagem: Optional[str] = Field(None, example="ML executado com sucesso", description="Mensagem final ou detalhe do erro")
+    etapa: Optional[str] = Field(None, example="produtos", description="Etapa atual: 'receita', 'produtos', 'gravando' ou 'concluido'")
+    progresso: float = Field(0.0, example=55.0, description="Percentual concluído (0-100)")
+    previsoes_geradas: int = Field(0, example=36, description="Previsões gravadas ao concluir")
 
 class ErrorResponse(BaseModel):
     detail: str = Field(..., description="Mensagem de erro detalhada")
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmark de requisições/s dos endpoints síncronos x assíncronos.
+
+Sobe a API (uvicorn) num subprocesso, com uma base SQLite de teste, e
+dispara N clientes concorrentes contra /metrics, /forecast e /auth/login.
+A versão assíncrona é a da API; a síncrona (`def` + sessão do threadpool,
+como os endpoints eram antes) é montada pelo próprio benchmark em
+/bench/sync/..., com as mesmas consultas.
+
+Uso: python benchmarks/endpoints_async.py [--clientes 200] [--segundos 10] [--vendas 5000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORTA = 8799
+PRODUTOS = 50
+# Produtos com previsão (a versão síncrona de comparação repete cada previsão por venda do produto)
+PRODUTOS_COM_PREVISAO = 2
+
+def _popular(engine, vendas):
+    from backend.auth import get_password_hash
+    from backend.migrations import _recalcular_resumo_mensal, _recalcular_distribuicao_ticket
+    from backend.models import Usuario, Produto, Venda, Forecast
+
+    inicio = date(2023, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Usuario.__table__.insert(), [{'email': 'admin@admin.com', 'senha_hash': get_password_hash('admin')}])
+        conn.execute(Produto.__table__.insert(), [
+            {'nome': f'Produto {i}', 'categoria': f'Categoria {i % 5}', 'preco': 100.0} for i in range(1, PRODUTOS + 1)
+        ])
+        datas = [inicio + timedelta(days=random.randint(0, 700)) for _ in range(vendas)]
+        conn.execute(Venda.__table__.insert(), [
+            {
+                'data': data,
+                'mes': data.year * 100 + data.month,
+                'produto_id': random.randint(1, PRODUTOS),
+                'usuario_id': 1,
+                'quantidade': random.randint(1, 5),
+                'valor_total': round(random.uniform(50, 5000), 2),
+            }
+            for data in datas
+        ])
+        # Resumos lidos pelo /metrics assíncrono (a importação os mantém na API real)
+        _recalcular_resumo_mensal(conn)
+        _recalcular_distribuicao_ticket(conn)
+        conn.execute(Forecast.__table__.insert(), [
+            {'usuario_id': 1, 'produto_id': p, 'data_prevista': date(2025, m, 1), 'qtd_prevista': 1000.0, 'intervalo_conf': '[900.0,1100.0]'}
+            for p in range(1, PRODUTOS_COM_PREVISAO + 1) for m in (1, 2, 3)
+        ])
+
+def servidor(args):
+    """Roda dentro do subprocesso: popula a base e sobe a API com as rotas síncronas de comparação"""
+    sys.path.insert(0, RAIZ)
+    import uvicorn
+    from fastapi import Depends, HTTPException
+    from fastapi.security import OAuth2PasswordRequestForm
+    from jose import jwt, JWTError
+    from sqlalchemy import func
+    from sqlalchemy.orm import Session, sessionmaker
+    from backend.auth import SECRET_KEY, ALGORITHM, oauth2_scheme, verify_password, create_access_token
+    from backend.database import DATABASE_URL, engine, criar_engine, get_db
+    from backend.main import app
+    from backend.models import Usuario, Produto, Venda, Forecast
+
+    _popular(engine, args.vendas)
+
+    # Sessão síncrona somente leitura, como as leituras do dashboard antes dos endpoints assíncronos
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False,
+                                    bind=criar_engine(DATABASE_URL, somente_leitura=True))
+
+    def get_read_db():
+        db = ReadSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def usuario_sync(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        try:
+            email = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            raise HTTPException(status_code=401)
+        user = db.query(Usuario).filter(Usuario.email == email).first()
+        if user is None:
+            raise HTTPException(status_code=401)
+        return user
+
+    @app.post("/bench/sync/auth/login")
+    def login_sync(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+        user = db.query(Usuario).filter(Usuario.email == form_data.username).first()
+        if not user or not verify_password(form_data.password, user.senha_hash):
+            raise HTTPException(status_code=400)
+        return {"access_token": create_access_token(data={"sub": user.email}), "token_type": "bearer"}
+
+    @app.get("/bench/sync/metrics")
+    def metrics_sync(db: Session = Depends(get_read_db), user: Usuario = Depends(usuario_sync)):
+        do_usuario = Venda.usuario_id == user.id
+        receita_total = db.query(func.sum(Venda.valor_total)).filter(do_usuario).scalar() or 0
+        ticket_medio = db.query(func.avg(Venda.valor_total)).filter(do_usuario).scalar() or 0
+        mais_vendido = db.query(Produto.nome, func.sum(Venda.quantidade)).join(Venda).filter(do_usuario)\
+            .group_by(Produto.id).order_by(func.sum(Venda.quantidade).desc()).first()
+        evolucao = db.query(func.strftime('%Y-%m', Venda.data).label('mes'), func.sum(Venda.valor_total))\
+            .filter(do_usuario).group_by('mes').order_by('mes').all()
+        top = db.query(Produto.nome, func.sum(Venda.valor_total), func.sum(Venda.quantidade)).join(Venda)\
+            .filter(do_usuario).group_by(Produto.id).order_by(func.sum(Venda.valor_total).desc()).limit(5).all()
+        categorias = db.query(Produto.categoria, func.sum(Venda.valor_total), func.count(Venda.id)).join(Venda)\
+            .filter(do_usuario).group_by(Produto.categoria).all()
+        total = db.query(func.count(Venda.id)).filter(do_usuario).scalar() or 0
+        unicos = db.query(func.count(func.distinct(Produto.id))).join(Venda).filter(do_usuario).scalar() or 0
+        return {
+            "receita_total": receita_total, "ticket_medio": ticket_medio,
+            "produto_mais_vendido": mais_vendido[0] if mais_vendido else None,
+            "evolucao_mensal": [{"mes": m, "receita": v} for m, v in evolucao],
+            "top_produtos": [{"nome": n, "receita": r, "quantidade": q} for n, r, q in top],
+            "vendas_categoria": [{"categoria": c, "receita": r, "num_vendas": n} for c, r, n in categorias],
+            "total_vendas": total, "produtos_unicos": unicos,
+        }
+
+    @app.get("/bench/sync/forecast")
+    def forecast_sync(db: Session = Depends(get_read_db), user: Usuario = Depends(usuario_sync)):
+        linhas = db.query(Forecast, Produto.nome).join(Produto, Forecast.produto_id == Produto.id)\
+            .join(Venda, Venda.produto_id == Produto.id).filter(Venda.usuario_id == user.id).all()
+        return [
+            {"produto_id": f.produto_id, "produto_nome": nome, "data_prevista": f.data_prevista,
+             "qtd_prevista": f.qtd_prevista, "intervalo_conf": f.intervalo_conf}
+            for f, nome in linhas
+        ]
+
+    uvicorn.run(app, host='127.0.0.1', port=PORTA, log_level='warning')
+
+async def _carga(cliente, metodo, caminho, segundos, clientes, **kwargs):
+    latencias = []
+    erros = [0]
+    inicio_cenario = time.perf_counter()
+    fim = inicio_cenario + segundos
+
+    async def usuario():
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(metodo, caminho, **kwargs)
+                if resposta.status_code == 200:
+                    latencias.append(time.perf_counter() - inicio)
+                else:
+                    erros[0] += 1
+            except Exception:
+                erros[0] += 1
+
+    await asyncio.gather(*(usuario() for _ in range(clientes)))
+    # Conta até a última resposta: requisições enfileiradas no servidor entram no tempo
+    duracao = time.perf_counter() - inicio_cenario
+    latencias.sort()
+    percentil = lambda p: round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 1) if latencias else None
+    return {
+        'req_por_segundo': round(len(latencias) / duracao, 1),
+        'latencia_p50_ms': percentil(0.50),
+        'latencia_p95_ms': percentil(0.95),
+        'erros': erros[0],
+    }
+
+async def medir(args):
+    import httpx
+
+    limites = httpx.Limits(max_connections=args.clientes, max_keepalive_connections=args.clientes)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{PORTA}', limits=limites, timeout=120) as cliente:
+        credenciais = {'data': {'username': 'admin@admin.com', 'password': 'admin'}}
+        token = (await cliente.post('/auth/login', **credenciais)).json()['access_token']
+        autorizado = {'headers': {'Authorization': f'Bearer {token}'}}
+        cenarios = [
+            ('GET', 'metrics', autorizado),
+            ('GET', 'forecast', autorizado),
+            ('POST', 'auth/login', credenciais),
+        ]
+        for metodo, rota, kwargs in cenarios:
+            for versao, prefixo in (('sync', '/bench/sync/'), ('async', '/')):
+                resultado = await _carga(cliente, metodo, prefixo + rota, args.segundos, args.clientes, **kwargs)
+                print(f"/{rota:12s} {versao:6s} {resultado}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clientes', type=int, default=200, help="requisições simultâneas")
+    parser.add_argument('--segundos', type=float, default=10, help="duração de cada cenário")
+    parser.add_argument('--vendas', type=int, default=5000)
+    parser.add_argument('--servidor', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servidor:
+        servidor(args)
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{pasta}/bench.db")
+        processo = subprocess.Popen(
+            [sys.executable, __file__, '--servidor', '--vendas', str(args.vendas)],
+            env=env, cwd=pasta,
+        )
+        try:
+            import httpx
+            for _ in range(120):
+                try:
+                    httpx.get(f'http://127.0.0.1:{PORTA}/docs', timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.5)
+            asyncio.run(medir(args))
+        finally:
+            processo.terminate()
+            processo.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do /export/vendas.
+
+Popula uma base SQLite com N vendas de um usuário e mede o pico de memória
+(ru_maxrss) de um processo que exporta todas elas em NDJSON: carregando o
+resultado inteiro e serializando de uma vez (como um endpoint comum faria)
+x pelo gerador exportar, que lê o cursor em lotes de EXPORT_YIELD_PER.
+Cada medição roda num subprocesso próprio, para o pico não se misturar.
+
+Uso: python benchmarks/exportacao.py [--vendas 100000 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRODUTOS = 200
+
+def _popular(engine, vendas):
+    from backend.models import Usuario, Produto, Venda
+
+    inicio = date(2021, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Usuario.__table__.insert(), [{'email': 'u1@bench', 'senha_hash': '-'}])
+        conn.execute(Produto.__table__.insert(), [
+            {'nome': f'Produto {i}', 'categoria': f'Categoria {i % 8}', 'preco': 100.0} for i in range(1, PRODUTOS + 1)
+        ])
+        for feitas in range(0, vendas, 50000):
+            lote = []
+            for _ in range(min(50000, vendas - feitas)):
+                data = inicio + timedelta(days=random.randint(0, 1460))
+                lote.append({
+                    'data': data, 'mes': data.year * 100 + data.month,
+                    'produto_id': random.randint(1, PRODUTOS), 'usuario_id': 1,
+                    'quantidade': random.randint(1, 5), 'valor_total': round(random.uniform(50, 5000), 2),
+                })
+            conn.execute(Venda.__table__.insert(), lote)
+
+async def _exportar(modo):
+    from backend.database import async_read_engine, fechar_engines_async
+    from backend.exportacao import consulta_vendas, exportar, _ndjson
+
+    consulta = consulta_vendas(1)
+    total = 0
+    if modo == 'tudo':
+        async with async_read_engine.connect() as conn:
+            resultado = await conn.execute(consulta)
+            colunas = list(resultado.keys())
+            total = len(_ndjson(colunas, resultado.all()))
+    else:
+        async for bloco in exportar(consulta, 'ndjson'):
+            total += len(bloco)
+    await fechar_engines_async()
+    return total
+
+def popular(vendas):
+    """Roda dentro do subprocesso: cria a base de DATABASE_URL e insere as vendas"""
+    sys.path.insert(0, RAIZ)
+    from backend.database import engine
+    from backend.migrations import aplicar_migracoes
+
+    aplicar_migracoes(engine)
+    _popular(engine, vendas)
+
+def medir(modo):
+    """Roda dentro do subprocesso: exporta e imprime bytes, segundos e pico de memória (MB)"""
+    sys.path.insert(0, RAIZ)
+    inicio = time.perf_counter()
+    total = asyncio.run(_exportar(modo))
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(total, round(segundos, 2), round(pico, 1))
+
+def _subprocesso(base, *argumentos):
+    return subprocess.run([sys.executable, os.path.abspath(__file__), *argumentos],
+                          env={**os.environ, 'DATABASE_URL': base}, check=True,
+                          capture_output=True, text=True).stdout
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--vendas', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--popular', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--medir', choices=['tudo', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.popular:
+        return popular(args.popular)
+    if args.medir:
+        return medir(args.medir)
+
+    print("| Vendas | Modo | Bytes | Tempo | Pico de memória |")
+    print("|---|---|---:|---:|---:|")
+    for vendas in args.vendas:
+        base = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+        _subprocesso(base, '--popular', str(vendas))
+        for modo in ('tudo', 'streaming'):
+            total, segundos, pico = _subprocesso(base, '--medir', modo).split()[-3:]
+            print(f"| {vendas} | {modo} | {total} | {segundos} s | {pico} MB |")
+
+if __name__ == "__main__":
+    main()
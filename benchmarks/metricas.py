@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência do cálculo do /metrics.
+
+Compara as oito consultas originais sobre a tabela vendas (soma, média,
+produto mais vendido, evolução mensal com strftime, top 5, categorias,
+contagem e produtos distintos) com calcular_metricas, que faz três
+consultas aos resumos mensais: duas a vendas_mensais (por produto e por
+mês) e uma a vendas_ticket (percentis e histograma do ticket).
+
+Uso: python benchmarks/metricas.py [--vendas 1000000] [--produtos 200] [--repeticoes 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _popular(engine, vendas, produtos, usuarios=4):
+    from backend.migrations import _recalcular_resumo_mensal, _recalcular_distribuicao_ticket
+    from backend.models import Usuario, Produto, Venda
+
+    inicio = date(2021, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(Usuario.__table__.insert(), [{'email': f'u{i}@bench', 'senha_hash': '-'} for i in range(1, usuarios + 1)])
+        conn.execute(Produto.__table__.insert(), [
+            {'nome': f'Produto {i}', 'categoria': f'Categoria {i % 8}', 'preco': 100.0} for i in range(1, produtos + 1)
+        ])
+        for feitas in range(0, vendas, 50000):
+            lote = []
+            for _ in range(min(50000, vendas - feitas)):
+                data = inicio + timedelta(days=random.randint(0, 1460))
+                lote.append({
+                    'data': data, 'mes': data.year * 100 + data.month,
+                    'produto_id': random.randint(1, produtos), 'usuario_id': 1,
+                    'quantidade': random.randint(1, 5), 'valor_total': round(random.uniform(50, 5000), 2),
+                })
+            conn.execute(Venda.__table__.insert(), lote)
+        _recalcular_resumo_mensal(conn)
+        _recalcular_distribuicao_ticket(conn)
+
+def _metricas_originais(db, usuario_id):
+    """As oito consultas do /metrics antes do resumo mensal"""
+    from sqlalchemy import func
+    from backend.models import Produto, Venda
+
+    do_usuario = Venda.usuario_id == usuario_id
+    db.query(func.sum(Venda.valor_total)).filter(do_usuario).scalar()
+    db.query(func.avg(Venda.valor_total)).filter(do_usuario).scalar()
+    db.query(Produto.nome, func.sum(Venda.quantidade)).join(Venda).filter(do_usuario)\
+        .group_by(Produto.id).order_by(func.sum(Venda.quantidade).desc()).first()
+    db.query(func.strftime('%Y-%m', Venda.data).label('mes'), func.sum(Venda.valor_total))\
+        .filter(do_usuario).group_by('mes').order_by('mes').all()
+    db.query(Produto.nome, func.sum(Venda.valor_total), func.sum(Venda.quantidade)).join(Venda)\
+        .filter(do_usuario).group_by(Produto.id).order_by(func.sum(Venda.valor_total).desc()).limit(5).all()
+    db.query(Produto.categoria, func.sum(Venda.valor_total), func.count(Venda.id)).join(Venda)\
+        .filter(do_usuario).group_by(Produto.categoria).all()
+    db.query(func.count(Venda.id)).filter(do_usuario).scalar()
+    db.query(func.count(func.distinct(Produto.id))).join(Venda).filter(do_usuario).scalar()
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tempos), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--vendas', type=int, default=1000000)
+    parser.add_argument('--produtos', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{pasta}/bench.db"
+    sys.path.insert(0, RAIZ)
+    from sqlalchemy import event
+    from sqlalchemy.orm import sessionmaker
+    from backend.database import DATABASE_URL, engine, criar_engine, async_read_engine, AsyncReadSessionLocal, fechar_engines_async
+    from backend.metricas import calcular_metricas
+    from backend.migrations import aplicar_migracoes
+
+    aplicar_migracoes(engine)
+    inicio = time.perf_counter()
+    _popular(engine, args.vendas, args.produtos)
+    print(f"{args.vendas} vendas gravadas em {time.perf_counter() - inicio:.1f}s")
+
+    # As consultas originais rodavam num engine síncrono somente leitura, que a API não tem mais
+    read_engine = criar_engine(DATABASE_URL, somente_leitura=True)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+    consultas = {'antes': 0, 'depois': 0}
+    def contador(nome):
+        def contar(*_):
+            consultas[nome] += 1
+        return contar
+    event.listen(read_engine, 'before_cursor_execute', contador('antes'))
+    event.listen(async_read_engine.sync_engine, 'before_cursor_execute', contador('depois'))
+
+    def antes():
+        db = ReadSessionLocal()
+        try:
+            _metricas_originais(db, 1)
+        finally:
+            db.close()
+
+    async def depois():
+        async with AsyncReadSessionLocal() as db:
+            await calcular_metricas(db, 1)
+
+    async def depois_repetido():
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            await depois()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        await fechar_engines_async()
+        return round(statistics.median(tempos), 1)
+
+    ms_antes = _medir(antes, args.repeticoes)
+    ms_depois = asyncio.run(depois_repetido())
+    print(f"antes   {consultas['antes'] // args.repeticoes} consultas sobre vendas     mediana {ms_antes} ms")
+    print(f"depois  {consultas['depois'] // args.repeticoes} consultas a vendas_mensais e vendas_ticket  mediana {ms_depois} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialização e tamanho das respostas do /forecast e /metrics.
+
+Compara o caminho padrão do FastAPI (validação pelo response_model,
+jsonable_encoder e json da biblioteca padrão) com RespostaJSON, que
+serializa direto o conteúdo montado pelo endpoint (orjson, se instalado,
+e json da biblioteca padrão como alternativa). Mede também o tamanho do
+corpo sem compressão, com gzip e, se o pacote brotli existir, com brotli.
+
+Uso: python benchmarks/serializacao.py [--previsoes 20000] [--repeticoes 20]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _previsoes(quantidade):
+    inicio = date(2025, 1, 1)
+    return [
+        {
+            'produto_id': i % 500 + 1,
+            'produto_nome': f'Produto {i % 500 + 1}',
+            'data_prevista': inicio + timedelta(days=30 * (i // 500)),
+            'qtd_prevista': round(random.uniform(100, 10000), 6),
+            'intervalo_conf': f'[{random.uniform(50, 100):.2f},{random.uniform(10000, 20000):.2f}]',
+        }
+        for i in range(quantidade)
+    ]
+
+def _metricas(meses=48, produtos=200):
+    return {
+        'receita_total': 1234567.89, 'ticket_medio': 812.5, 'produto_mais_vendido': 'Produto 7',
+        'ticket_percentis': {'p50': 320.1, 'p90': 2100.4, 'p99': 8800.0},
+        'histograma_ticket': [{'de': 10.0 * 2 ** i, 'ate': 10.0 * 2 ** (i + 1), 'num_vendas': random.randint(0, 999)} for i in range(12)],
+        'granularidade': 'month',
+        'evolucao_mensal': [{'mes': f'{2021 + m // 12}-{m % 12 + 1:02d}', 'receita': random.uniform(1e4, 1e5)} for m in range(meses)],
+        'top_produtos': [{'nome': f'Produto {i}', 'receita': random.uniform(1e4, 1e5), 'quantidade': random.randint(1, 999)} for i in range(5)],
+        'vendas_categoria': [{'categoria': f'Categoria {i}', 'receita': random.uniform(1e4, 1e5), 'num_vendas': random.randint(1, 9999)} for i in range(8)],
+        'total_vendas': 1519, 'produtos_unicos': produtos,
+    }
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tempos), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--previsoes', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    sys.path.insert(0, RAIZ)
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from backend import respostas
+    from backend.main import app
+
+    rotas = {rota.path: rota for rota in app.routes if getattr(rota, 'methods', None) and 'GET' in rota.methods}
+    payloads = {'/forecast': _previsoes(args.previsoes), '/metrics': _metricas()}
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    orjson = respostas.orjson
+    print(f"orjson {'instalado' if orjson else 'ausente'}; brotli {'instalado' if brotli else 'ausente'}")
+    print(f"| Endpoint | Serialização | Mediana | Bytes | gzip ({respostas.COMPRESSAO_NIVEL_GZIP}) | brotli ({respostas.COMPRESSAO_QUALIDADE_BROTLI}) |")
+    print("|---|---|---:|---:|---:|---:|")
+    for caminho, conteudo in payloads.items():
+        campo = rotas[caminho].secure_cloned_response_field
+
+        def padrao():
+            # O que o FastAPI faz com o retorno de um endpoint com response_model
+            validado = asyncio.run(serialize_response(field=campo, response_content=conteudo, is_coroutine=True))
+            return JSONResponse(validado).body
+
+        def direto():
+            return respostas.RespostaJSON(conteudo).body
+
+        def direto_sem_orjson():
+            respostas.orjson = None
+            try:
+                return respostas.RespostaJSON(conteudo).body
+            finally:
+                respostas.orjson = orjson
+
+        variantes = [('response_model + json', padrao), ('RespostaJSON (json)', direto_sem_orjson)]
+        if orjson:
+            variantes.append(('RespostaJSON (orjson)', direto))
+        for nome, funcao in variantes:
+            corpo = funcao()
+            ms = _medir(funcao, args.repeticoes)
+            comprimido = len(gzip.compress(corpo, compresslevel=respostas.COMPRESSAO_NIVEL_GZIP))
+            br = len(brotli.compress(corpo, quality=respostas.COMPRESSAO_QUALIDADE_BROTLI)) if brotli else '-'
+            print(f"| `{caminho}` | {nome} | {ms} ms | {len(corpo)} | {comprimido} | {br} |")
+
+if __name__ == "__main__":
+    main()
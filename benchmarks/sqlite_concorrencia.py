@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concorrência leitura/escrita no SQLite.
+
+Compara o perfil padrão do SQLite (rollback journal, synchronous=FULL,
+cache pequeno) com o perfil aplicado por backend/database.py (WAL,
+synchronous=NORMAL, mmap, cache maior). Uma thread grava vendas em
+transações longas (como um job do /import, que só faz commit no fim)
+enquanto outras executam a agregação mensal do /metrics.
+
+Uso: python benchmarks/sqlite_concorrencia.py [--vendas 200000] [--segundos 10] [--leitores 4] [--transacao 100000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERFIS = {
+    'padrao': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+        'SQLITE_TEMP_STORE': 'DEFAULT',
+        'SQLITE_BUSY_TIMEOUT': '5000',
+    },
+    'otimizado': {},  # valores padrão de backend/database.py
+}
+
+CONSULTA_METRICAS = """
+    SELECT strftime('%Y-%m', data) AS mes, SUM(valor_total), COUNT(id)
+    FROM vendas WHERE usuario_id = 1 GROUP BY mes
+"""
+
+def _vendas(quantidade, inicio=date(2020, 1, 1)):
+    for _ in range(quantidade):
+        yield {
+            'data': inicio + timedelta(days=random.randint(0, 1800)),
+            'produto_id': random.randint(1, 50),
+            'usuario_id': random.randint(1, 4),
+            'quantidade': random.randint(1, 5),
+            'valor_total': round(random.uniform(50, 5000), 2),
+        }
+
+def executar(args):
+    """Roda dentro do subprocesso, com o perfil já definido nas variáveis de ambiente"""
+    sys.path.insert(0, RAIZ)
+    from sqlalchemy import text
+    from backend.database import engine
+    from backend.migrations import aplicar_migracoes
+    from backend.models import Produto, Venda
+
+    aplicar_migracoes(engine)
+    with engine.begin() as conn:
+        conn.execute(Produto.__table__.insert(), [{'nome': f'Produto {i}', 'categoria': 'Bench', 'preco': 1.0} for i in range(1, 51)])
+        conn.execute(Venda.__table__.insert(), list(_vendas(args.vendas)))
+
+    parar = threading.Event()
+    latencias = []
+    erros = {'leitura': 0, 'escrita': 0}
+    escritas = [0]
+
+    def escritor():
+        while not parar.is_set():
+            try:
+                with engine.begin() as conn:
+                    # Vários executemany numa mesma transação, como o importador
+                    for _ in range(0, args.transacao, 5000):
+                        conn.execute(Venda.__table__.insert(), list(_vendas(5000)))
+                escritas[0] += args.transacao
+            except Exception:
+                erros['escrita'] += 1
+
+    def leitor():
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(CONSULTA_METRICAS)).all()
+                latencias.append(time.perf_counter() - inicio)
+            except Exception:
+                erros['leitura'] += 1
+
+    threads = [threading.Thread(target=escritor)] + [threading.Thread(target=leitor) for _ in range(args.leitores)]
+    for t in threads:
+        t.start()
+    time.sleep(args.segundos)
+    parar.set()
+    for t in threads:
+        t.join()
+
+    latencias.sort()
+    percentil = lambda p: round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 1) if latencias else None
+    print(json.dumps({
+        'leituras_por_segundo': round(len(latencias) / args.segundos, 1),
+        'latencia_p50_ms': percentil(0.50),
+        'latencia_p95_ms': percentil(0.95),
+        'vendas_escritas_por_segundo': round(escritas[0] / args.segundos, 1),
+        'erros': erros,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--vendas', type=int, default=200000)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--transacao', type=int, default=100000, help="vendas gravadas por transação")
+    parser.add_argument('--executar', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar:
+        executar(args)
+        return
+
+    for nome, variaveis in PERFIS.items():
+        with tempfile.TemporaryDirectory() as pasta:
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{pasta}/bench.db", **variaveis)
+            saida = subprocess.run(
+                [sys.executable, __file__, '--executar', '--vendas', str(args.vendas),
+                 '--segundos', str(args.segundos), '--leitores', str(args.leitores),
+                 '--transacao', str(args.transacao)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            resultado = json.loads(saida.strip().splitlines()[-1])
+            print(f"{nome:10s} {resultado}")
+
+if __name__ == "__main__":
+    main()
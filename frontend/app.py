@@ -20,6 +20,103 @@ def format_number(value, decimals=2):
     else:
         return f"{value:,.{decimals}f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
+# Opções do filtro de métricas: dias para trás (None = todo o histórico) e granularidade da API
+PERIODOS = {"Todo o período": None, "Últimos 30 dias": 30, "Últimos 90 dias": 90, "Últimos 12 meses": 365}
+GRANULARIDADES = {"Dia": 'day', "Semana": 'week', "Mês": 'month', "Trimestre": 'quarter'}
+
+# Previsões: página pedida ao /forecast e campos usados nos gráficos
+FORECAST_PAGINA = 1000
+FORECAST_CAMPOS = "produto_id,produto_nome,data_prevista,qtd_prevista"
+
+# Extensões aceitas pelo POST /import (backend.importer.EXTENSOES_ACEITAS). O
+# seletor de arquivos só filtra pela última extensão, então aceita qualquer .gz
+EXTENSOES_ACEITAS = ('.csv', '.csv.gz', '.parquet')
+# Linhas lidas para o preview do upload (o arquivo inteiro só é lido pela API)
+PREVIEW_LINHAS = 5
+
+def ler_preview(file):
+    """Primeiras linhas do arquivo enviado. Parquet exige o pacote opcional pyarrow."""
+    nome = file.name.lower()
+    try:
+        if nome.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            return next(pq.ParquetFile(file).iter_batches(batch_size=PREVIEW_LINHAS)).to_pandas()
+        return pd.read_csv(file, compression='gzip' if nome.endswith('.gz') else None, nrows=PREVIEW_LINHAS)
+    finally:
+        file.seek(0)
+
+def api_get_json(path, headers, params=None):
+    """
+    GET que reaproveita a última resposta: envia If-None-Match com o ETag guardado
+    na sessão e, se a API responder 304, devolve o payload em cache.
+    Retorna (status_code, payload ou None, texto da resposta).
+    """
+    status, payload, texto, _ = _api_get(path, headers, params)
+    return status, payload, texto
+
+def api_get_paginas(path, headers, params=None, limite=FORECAST_PAGINA):
+    """
+    Lista completa de um endpoint paginado por cursor (X-Next-Cursor), página a
+    página, cada uma com o próprio ETag em cache. Retorna como api_get_json.
+    """
+    itens = []
+    cursor = None
+    while True:
+        pagina = {**(params or {}), 'limit': limite, **({'cursor': cursor} if cursor else {})}
+        status, payload, texto, cursor = _api_get(path, headers, pagina)
+        if status != 200:
+            return status, None, texto
+        itens.extend(payload or [])
+        if not cursor:
+            return 200, itens, ""
+
+def _api_get(path, headers, params=None):
+    cache = st.session_state.setdefault('api_cache', {})
+    chave = (path, headers.get("Authorization"), tuple(sorted((params or {}).items())))
+    enviados = dict(headers)
+    if chave in cache:
+        enviados["If-None-Match"] = cache[chave]['etag']
+
+    resp = requests.get(f"{API_URL}{path}", headers=enviados, params=params)
+    if resp.status_code == 304 and chave in cache:
+        return 200, cache[chave]['payload'], "", cache[chave]['proximo']
+    if resp.status_code != 200 or not resp.text.strip():
+        return resp.status_code, None, resp.text, None
+
+    payload = resp.json()
+    proximo = resp.headers.get("X-Next-Cursor")
+    if resp.headers.get("ETag"):
+        cache[chave] = {'etag': resp.headers["ETag"], 'payload': payload, 'proximo': proximo}
+    return 200, payload, resp.text, proximo
+
+# Etapas do job de ML (GET /run-ml/{job_id}) exibidas na barra de progresso
+ETAPAS_ML = {'receita': "Prevendo receita", 'produtos': "Analisando produtos", 'gravando': "Gravando previsões", 'concluido': "Concluído"}
+
+def executar_ml(headers):
+    """
+    Enfileira o ML (POST /run-ml) e acompanha o job até o fim com uma barra de
+    progresso. Retorna True se as previsões foram geradas.
+    """
+    resp = requests.post(f"{API_URL}/run-ml", headers=headers, timeout=10)
+    if resp.status_code != 202:
+        st.error(f"❌ Erro HTTP {resp.status_code}")
+        st.code(resp.text, language="text")
+        return False
+
+    job = resp.json()
+    barra = st.progress(0, text="⏳ Na fila...")
+    while job['status'] in ('pendente', 'processando'):
+        time.sleep(1)
+        job = requests.get(f"{API_URL}/run-ml/{job['job_id']}", headers=headers, timeout=10).json()
+        etapa = ETAPAS_ML.get(job.get('etapa'), "Na fila")
+        barra.progress(min(int(job['progresso']), 100), text=f"🔄 {etapa} ({job['progresso']:.0f}%)")
+
+    if job['status'] == 'concluido':
+        barra.progress(100, text=f"✅ {format_number(job['previsoes_geradas'], 0)} previsões geradas")
+        return True
+    st.error(f"❌ Erro no ML: {job.get('mensagem') or 'Erro desconhecido'}")
+    return False
+
 def login():
     st.title("🚀 Sistema de Vendas e Previsões")
     
@@ -71,7 +168,7 @@ def login():
 def upload_csv(token):
     st.header("📊 Importar Dados de Vendas")
     
-    st.info("📋 **Formato esperado do CSV:**\n`data, produto, categoria, preco, quantidade, valor_total`")
+    st.info("📋 **Colunas esperadas (CSV, CSV.GZ ou Parquet):**\n`data, produto, categoria, preco, quantidade, valor_total`")
     
     with st.expander("📄 Ver exemplo de dados"):
         exemplo_data = {
@@ -84,27 +181,68 @@ def upload_csv(token):
         }
         st.dataframe(pd.DataFrame(exemplo_data))
     
-    file = st.file_uploader("📁 Escolha o arquivo CSV", type=["csv"])
-    if file:
+    file = st.file_uploader("📁 Escolha o arquivo (CSV, CSV.GZ ou Parquet)", type=["csv", "gz", "parquet"])
+    if file and not file.name.lower().endswith(EXTENSOES_ACEITAS):
+        st.error("❌ Arquivo deve ser CSV, CSV.GZ ou Parquet: arquivos .gz precisam terminar em .csv.gz")
+    elif file:
+        # O preview é opcional: sem ele o arquivo ainda pode ser importado, e a API valida tudo
         try:
-            preview_df = pd.read_csv(file)
+            preview_df = ler_preview(file)
             st.subheader("👀 Preview dos dados")
-            st.dataframe(preview_df.head())
-            
-            if st.button("🚀 Importar Dados", type="primary"):
+            st.dataframe(preview_df)
+        except ImportError:
+            st.info("ℹ️ Preview de Parquet indisponível (pyarrow não instalado no frontend)")
+        except Exception as e:
+            st.warning(f"⚠️ Não foi possível mostrar o preview: {str(e)}")
+
+        modos = {
+            "Estrito (qualquer erro cancela a importação)": "estrito",
+            "Parcial (importa as linhas válidas)": "parcial",
+            "Somente validar": "validar",
+        }
+        modo = modos[st.selectbox("🧪 Modo de validação", list(modos))]
+
+        if st.button("🚀 Importar Dados", type="primary"):
+            try:
                 files = {"file": (file.name, file.getvalue())}
                 headers = {"Authorization": f"Bearer {token}"}
-                
-                with st.spinner("⏳ Importando dados..."):
-                    resp = requests.post(f"{API_URL}/import", files=files, headers=headers)
-                    if resp.status_code == 200:
-                        st.success("✅ Importação realizada com sucesso!")
+
+                with st.spinner("⏳ Enviando arquivo..."):
+                    resp = requests.post(f"{API_URL}/import", params={"modo": modo}, files=files, headers=headers)
+                if resp.status_code != 202:
+                    st.error("❌ Erro ao importar dados")
+                    return
+
+                # A importação roda em segundo plano: acompanhar o job até o fim
+                job_id = resp.json()['job_id']
+                progresso = st.empty()
+                while True:
+                    job = requests.get(f"{API_URL}/import/{job_id}", headers=headers).json()
+                    progresso.info(
+                        f"⏳ {job['status'].capitalize()}: {format_number(job['linhas_processadas'], 0)} linhas "
+                        f"({format_number(job['linhas_por_segundo'], 0)} linhas/s)"
+                    )
+                    if job['status'] in ('concluido', 'erro'):
+                        break
+                    time.sleep(1)
+
+                    if job['status'] == 'concluido' and modo == 'validar':
+                        progresso.info(f"🧪 {job['mensagem']}")
+                    elif job['status'] == 'concluido':
+                        progresso.success(
+                            f"✅ Importação realizada com sucesso! {format_number(job['linhas_processadas'], 0)} linhas "
+                            f"em {format_number(job['tempo_segundos'])}s"
+                        )
                         st.balloons()
                         st.info("💡 Agora vá para o Dashboard e execute o ML para gerar previsões!")
                     else:
-                        st.error("❌ Erro ao importar dados")
-        except Exception as e:
-            st.error(f"❌ Erro ao ler arquivo: {str(e)}")
+                        progresso.error(f"❌ Erro ao importar dados: {job.get('mensagem')}")
+
+                    if job.get('rejeicoes'):
+                        st.warning(f"⚠️ {format_number(job['linhas_rejeitadas'], 0)} linha(s) rejeitada(s)")
+                        st.dataframe(pd.DataFrame(job['rejeicoes']))
+            except Exception as e:
+                st.error(f"❌ Erro ao importar dados: {str(e)}")
 
 def show_dashboard(token):
     st.title("📊 Dashboard de Vendas e Previsões ML")
@@ -114,35 +252,19 @@ def show_dashboard(token):
     
     with col1:
         if st.button("🤖 Executar ML", type="primary"):
-            with st.spinner("🔄 Executando modelo de Machine Learning..."):
-                try:
-                    response = requests.post(f"{API_URL}/run-ml", headers=headers, timeout=60)
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result["status"] == "success":
-                            st.success("✅ ML executado com sucesso!")
-                            st.info("🔄 Recarregando dados...")
-                            time.sleep(2) 
-                            st.rerun()
-                        else:
-                            st.error(f"❌ Erro no ML: {result.get('message', 'Erro desconhecido')}")
-                            st.code(result.get('message', ''), language="text")
-                    else:
-                        st.error(f"❌ Erro HTTP {response.status_code}")
-                        try:
-                            error_detail = response.json()
-                            st.code(str(error_detail), language="json")
-                        except:
-                            st.code(response.text, language="text")
-                            
-                except requests.exceptions.Timeout:
-                    st.error("⏰ Timeout: ML está demorando muito. Tente novamente.")
-                except requests.exceptions.ConnectionError:
-                    st.error("🔌 Erro de conexão: Verifique se o backend está rodando")
-                except Exception as e:
-                    st.error(f"❌ Erro inesperado: {str(e)}")
-                    st.code(str(e), language="text")
+            try:
+                if executar_ml(headers):
+                    st.success("✅ ML executado com sucesso!")
+                    st.info("🔄 Recarregando dados...")
+                    time.sleep(2) 
+                    st.rerun()
+            except requests.exceptions.Timeout:
+                st.error("⏰ Timeout: a API não respondeu. Tente novamente.")
+            except requests.exceptions.ConnectionError:
+                st.error("🔌 Erro de conexão: Verifique se o backend está rodando")
+            except Exception as e:
+                st.error(f"❌ Erro inesperado: {str(e)}")
+                st.code(str(e), language="text")
     
     with col2:
         if st.button("🔄 Atualizar"):
@@ -156,28 +278,36 @@ def show_dashboard(token):
     with col4:
         st.caption("📅 Última atualização: " + datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
     
+    # Período e granularidade são aplicados pela API, que lê só as vendas do intervalo
+    col_periodo, col_granularidade = st.columns(2)
+    with col_periodo:
+        periodo = st.selectbox("📅 Período", list(PERIODOS), key="metrics_periodo")
+    with col_granularidade:
+        granularidade = st.selectbox("🗓️ Agrupar por", list(GRANULARIDADES), index=2, key="metrics_granularidade")
+    metrics_params = {'granularity': GRANULARIDADES[granularidade]}
+    if PERIODOS[periodo]:
+        metrics_params['start'] = (datetime.now().date() - timedelta(days=PERIODOS[periodo] - 1)).isoformat()
+    
     try:
         with st.spinner("📡 Carregando dados..."):
-            metrics_resp = requests.get(f"{API_URL}/metrics", headers=headers)
-            if metrics_resp.status_code != 200:
-                st.error(f"❌ Erro métricas HTTP {metrics_resp.status_code}")
-                st.text(metrics_resp.text)
+            # Métricas e previsões só são baixadas de novo quando o ETag muda
+            metrics_status, metrics, metrics_texto = api_get_json("/metrics", headers, metrics_params)
+            if metrics_status != 200:
+                st.error(f"❌ Erro métricas HTTP {metrics_status}")
+                st.text(metrics_texto)
                 return
-            if not metrics_resp.text.strip():
+            if metrics is None:
                 st.error("❌ Resposta vazia em /metrics")
                 return
-            metrics = metrics_resp.json()
 
-            forecast_resp = requests.get(f"{API_URL}/forecast", headers=headers)
-            if forecast_resp.status_code != 200:
-                st.warning(f"⚠️ Forecast HTTP {forecast_resp.status_code}")
-                st.text(forecast_resp.text)
+            forecast_status, forecast, forecast_texto = api_get_paginas("/forecast", headers, {'fields': FORECAST_CAMPOS})
+            if forecast_status != 200:
+                st.warning(f"⚠️ Forecast HTTP {forecast_status}")
+                st.text(forecast_texto)
                 forecast = []
-            elif not forecast_resp.text.strip():
+            elif forecast is None:
                 st.warning("⚠️ Forecast vazio")
                 forecast = []
-            else:
-                forecast = forecast_resp.json()
     except Exception as e:
         st.error(f"❌ Erro ao conectar com a API: {str(e)}")
         st.info(f"🔧 Verifique se o backend está rodando em {API_URL}")
@@ -331,22 +461,14 @@ def show_dashboard(token):
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("🚀 Executar ML Agora", key="ml_btn_2"):
-                    with st.spinner("🔄 Executando ML..."):
-                        try:
-                            headers = {"Authorization": f"Bearer {st.session_state['token']}"}
-                            response = requests.post(f"{API_URL}/run-ml", headers=headers, timeout=60)
-                            if response.status_code == 200:
-                                result = response.json()
-                                if result["status"] == "success":
-                                    st.success("✅ ML executado!")
-                                    time.sleep(1)
-                                    st.rerun()
-                                else:
-                                    st.error(f"❌ {result.get('message', 'Erro')}")
-                            else:
-                                st.error("❌ Erro HTTP")
-                        except Exception as e:
-                            st.error(f"❌ Erro: {str(e)}")
+                    try:
+                        headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+                        if executar_ml(headers):
+                            st.success("✅ ML executado!")
+                            time.sleep(1)
+                            st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Erro: {str(e)}")
             with col_b:
                 st.info("💡 Execute o ML para ver previsões de receita e produtos top!")
     
@@ -393,7 +515,30 @@ def show_dashboard(token):
                 st.dataframe(df_cat, use_container_width=True)
         else:
             st.warning("⚠️ Nenhum dado de categoria encontrado")
-    
+
+        st.subheader("💳 Distribuição do Ticket")
+
+        if metrics.get('histograma_ticket'):
+            percentis = metrics.get('ticket_percentis') or {}
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Mediana (p50)", f"R$ {format_number(percentis.get('p50'))}")
+            col2.metric("p90", f"R$ {format_number(percentis.get('p90'))}")
+            col3.metric("p99", f"R$ {format_number(percentis.get('p99'))}")
+
+            df_hist = pd.DataFrame(metrics['histograma_ticket'])
+            df_hist['faixa'] = df_hist.apply(lambda f: f"R$ {f['de']:,.0f} – {f['ate']:,.0f}", axis=1)
+            fig_hist = px.bar(
+                df_hist,
+                x='faixa',
+                y='num_vendas',
+                title="📊 Vendas por Faixa de Valor",
+                labels={'faixa': 'Valor da venda', 'num_vendas': 'Vendas'},
+                color_discrete_sequence=['#4ECDC4']
+            )
+            st.plotly_chart(fig_hist, use_container_width=True)
+        else:
+            st.info("ℹ️ Sem vendas no período para calcular a distribuição do ticket")
+
     with tab2:
         st.subheader("📈 Análise de Crescimento e Tendências")
         
@@ -584,22 +729,14 @@ def show_dashboard(token):
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("🚀 Executar ML", key="ml_btn_tab3"):
-                    with st.spinner("🔄 Executando ML..."):
-                        try:
-                            headers = {"Authorization": f"Bearer {st.session_state['token']}"}
-                            response = requests.post(f"{API_URL}/run-ml", headers=headers, timeout=60)
-                            if response.status_code == 200:
-                                result = response.json()
-                                if result["status"] == "success":
-                                    st.success("✅ ML executado com sucesso!")
-                                    time.sleep(1)
-                                    st.rerun()
-                                else:
-                                    st.error(f"❌ {result.get('message', 'Erro')}")
-                            else:
-                                st.error("❌ Erro HTTP")
-                        except Exception as e:
-                            st.error(f"❌ Erro: {str(e)}")
+                    try:
+                        headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+                        if executar_ml(headers):
+                            st.success("✅ ML executado com sucesso!")
+                            time.sleep(1)
+                            st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Erro: {str(e)}")
             with col2:
                 st.info("**Sobre as previsões:**\n- 💰 Receita futura por produto\n- 🏆 Ranking de produtos top\n- 📈 Tendências de crescimento")
     
@@ -825,6 +962,7 @@ def main():
             upload_csv(st.session_state['token'])
         elif menu == "🚪 Sair":
             st.session_state.pop('token', None)
+            st.session_state.pop('api_cache', None)
             st.success("👋 Logout realizado!")
             st.rerun()
 
@@ -1,4 +1,3 @@
-from sqlalchemy import create_engine
 import sys
 import os
 from datetime import datetime, timedelta
@@ -7,171 +6,215 @@ import math
 from collections import defaultdict
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.models import Base, Produto, Venda, Forecast, Usuario
-from sqlalchemy.orm import sessionmaker
+from backend.models import Base, Produto, VendaMensal, Forecast, Usuario
+from backend.database import SessionLocal
+from backend.jobs import atualizar_job
 from sqlalchemy import func
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./db.sqlite3')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def gerar_forecast():
-    print("🚀 Iniciando geração de previsões ML para RECEITA e TOP PRODUTOS...")
+def gerar_forecast(usuario_id=None, progresso=None):
+    """
+    Gera as previsões de um usuário, só com as vendas dele, substituindo apenas
+    as previsões desse usuário. Sem usuario_id, gera para cada usuário com vendas.
+    `progresso(etapa, percentual)`, se informado, é chamado a cada etapa.
+    Retorna o número de previsões gravadas.
+    """
     db = SessionLocal()
     
     try:
-        db.query(Forecast).delete()
-        db.commit()
-        print("🗑️ Previsões antigas removidas")
-        
-        print("� Gerando previsão de receita total...")
+        if usuario_id is None:
+            usuarios = [u for (u,) in db.query(VendaMensal.usuario_id).distinct().order_by(VendaMensal.usuario_id)]
+        else:
+            usuarios = [usuario_id]
+        total = 0
+        for indice, usuario in enumerate(usuarios):
+            etapa = None
+            if progresso is not None:
+                # Fração da etapa do usuário -> percentual do total de usuários
+                etapa = lambda nome, fracao, indice=indice: progresso(nome, round(100 * (indice + fracao) / len(usuarios), 1))
+            total += _gerar_forecast_usuario(db, usuario, etapa)
+        return total
+    except Exception as e:
+        print(f"❌ Erro geral no ML: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+def executar_ml(job_id, usuario_id):
+    """
+    Job do /run-ml: roda gerar_forecast no worker de jobs da API (sem subprocesso),
+    reportando etapa e percentual no estado do job.
+    """
+    total = gerar_forecast(usuario_id, lambda etapa, percentual: atualizar_job(job_id, etapa=etapa, progresso=percentual))
+    return {'mensagem': "ML executado com sucesso", 'etapa': 'concluido', 'progresso': 100.0, 'previsoes_geradas': total}
+
+def _gerar_forecast_usuario(db, usuario_id, progresso=None):
+    if progresso is None:
+        progresso = lambda etapa, fracao: None
+    print(f"🚀 Iniciando geração de previsões ML para RECEITA e TOP PRODUTOS (usuário {usuario_id})...")
+    do_usuario = VendaMensal.usuario_id == usuario_id
+    
+    # Removidas na mesma transação em que as novas são gravadas
+    removidas = db.query(Forecast).filter(Forecast.usuario_id == usuario_id).delete(synchronize_session=False)
+    print(f"🗑️ {removidas} previsões antigas do usuário removidas")
+    progresso('receita', 0.1)
+    
+    print("📈 Gerando previsão de receita total...")
+    
+    # Totais mensais vêm do resumo vendas_mensais, mantido pela importação
+    vendas_mensais = db.query(
+        VendaMensal.mes,
+        func.sum(VendaMensal.receita).label('receita_total')
+    ).filter(do_usuario).group_by(VendaMensal.mes).order_by(VendaMensal.mes).all()
+    
+    receita_forecast = []
+    if len(vendas_mensais) >= 2:
+        receitas = [float(receita) for mes, receita in vendas_mensais]
         
-        vendas_mensais = db.query(
-            func.strftime('%Y-%m', Venda.data).label('mes'),
-            func.sum(Venda.valor_total).label('receita_total')
-        ).group_by('mes').order_by('mes').all()
+        print(f"📊 Encontrados {len(receitas)} meses de dados de receita")
         
-        if len(vendas_mensais) >= 2:
-            receitas = [float(receita) for mes, receita in vendas_mensais]
+        if len(receitas) >= 3:
+            # Algoritmo simples de suavização exponencial
+            alpha = 0.3  # Fator de suavização
+            forecast = []
+            s = receitas[0]  # Valor inicial
             
-            print(f"📊 Encontrados {len(receitas)} meses de dados de receita")
+            # Calcular suavização para dados históricos
+            for r in receitas[1:]:
+                s = alpha * r + (1 - alpha) * s
             
-            if len(receitas) >= 3:
-                # Algoritmo simples de suavização exponencial
-                alpha = 0.3  # Fator de suavização
-                forecast = []
-                s = receitas[0]  # Valor inicial
-                
-                # Calcular suavização para dados históricos
-                for r in receitas[1:]:
-                    s = alpha * r + (1 - alpha) * s
-                
-                # Gerar previsões futuras
-                tendencia = (receitas[-1] - receitas[0]) / len(receitas)
-                for i in range(3):
-                    projecao = s + tendencia * (i + 1)
-                    forecast.append(max(0, projecao))
-                
-                receita_forecast = forecast
-            else:
-                # Previsão simples baseada em crescimento linear
-                crescimento = (receitas[-1] - receitas[0]) / len(receitas)
-                ultima_receita = receitas[-1]
-                receita_forecast = [max(0, ultima_receita + crescimento * (i+1)) for i in range(3)]
+            # Gerar previsões futuras
+            tendencia = (receitas[-1] - receitas[0]) / len(receitas)
+            for i in range(3):
+                projecao = s + tendencia * (i + 1)
+                forecast.append(max(0, projecao))
             
-            print(f"✅ Previsões de receita geradas: {receita_forecast}")
+            receita_forecast = forecast
+        else:
+            # Previsão simples baseada em crescimento linear
+            crescimento = (receitas[-1] - receitas[0]) / len(receitas)
+            ultima_receita = receitas[-1]
+            receita_forecast = [max(0, ultima_receita + crescimento * (i+1)) for i in range(3)]
         
-        print("🏆 Analisando produtos para prever TOP vendedores...")
+        print(f"✅ Previsões de receita geradas: {receita_forecast}")
+    
+    print("🏆 Analisando produtos para prever TOP vendedores...")
+    progresso('produtos', 0.3)
+    
+    total_forecasts = 0
+    
+    produto_scores = {}
+    
+    # Receita e quantidade por produto e mês do usuário, numa única consulta ao resumo
+    resumo_produtos = defaultdict(dict)
+    for produto_id, mes, receita, quantidade in db.query(
+        VendaMensal.produto_id, VendaMensal.mes,
+        func.sum(VendaMensal.receita), func.sum(VendaMensal.quantidade)
+    ).filter(do_usuario).group_by(VendaMensal.produto_id, VendaMensal.mes):
+        resumo_produtos[produto_id][mes] = {'receita': receita, 'quantidade': quantidade}
+    
+    # Só os produtos que o usuário vendeu
+    produtos = db.query(Produto).filter(Produto.id.in_(list(resumo_produtos))).order_by(Produto.id).all()
+    
+    passo = max(1, len(produtos) // 20)
+    for i, produto in enumerate(produtos):
+        if i % passo == 0:
+            progresso('produtos', 0.3 + 0.5 * i / len(produtos))
+        vendas_mensais = resumo_produtos[produto.id]
         
-        produtos = db.query(Produto).all()
-        total_forecasts = 0
+        # Converter para lista ordenada
+        meses_ordenados = sorted(vendas_mensais.keys())
+        receitas_mensais = [vendas_mensais[mes]['receita'] for mes in meses_ordenados if vendas_mensais[mes]['receita'] > 0]
         
-        produto_scores = {}
+        if len(receitas_mensais) == 0:
+            produto_scores[produto.id] = 0
+            continue
         
-        for produto in produtos:
-            vendas = db.query(Venda).filter(Venda.produto_id == produto.id).all()
-            
-            if not vendas:
-                produto_scores[produto.id] = 0
-                continue
-                
-            # Processar vendas sem pandas - agrupar por mês
-            vendas_mensais = defaultdict(lambda: {'receita': 0, 'quantidade': 0})
-            
-            for venda in vendas:
-                mes_key = f"{venda.data.year}-{venda.data.month:02d}"
-                vendas_mensais[mes_key]['receita'] += venda.valor_total
-                vendas_mensais[mes_key]['quantidade'] += venda.quantidade
-            
-            # Converter para lista ordenada
-            meses_ordenados = sorted(vendas_mensais.keys())
-            receitas_mensais = [vendas_mensais[mes]['receita'] for mes in meses_ordenados if vendas_mensais[mes]['receita'] > 0]
-            
-            if len(receitas_mensais) == 0:
-                produto_scores[produto.id] = 0
-                continue
-            
-            # Calcular score baseado em:
-            # 1. Receita média
-            # 2. Tendência de crescimento
-            # 3. Consistência (menos variação = melhor)
-            
-            receita_media = sum(receitas_mensais) / len(receitas_mensais)
-            
-            if len(receitas_mensais) >= 2:
-                # Tendência de crescimento
-                crescimento = (receitas_mensais[-1] - receitas_mensais[0]) / receitas_mensais[0]
-                # Consistência (inverso do coeficiente de variação)
-                variancia = sum((x - receita_media) ** 2 for x in receitas_mensais) / len(receitas_mensais)
-                desvio_padrao = math.sqrt(variancia)
-                coef_variacao = desvio_padrao / receita_media if receita_media > 0 else 1
-                consistencia = 1 / (coef_variacao + 0.1)
-            else:
-                crescimento = 0
-                consistencia = 1
-            
-            # Score composto
-            score = receita_media * (1 + crescimento) * consistencia
-            produto_scores[produto.id] = max(0, score)
-            
-            print(f"📈 {produto.nome}: Score = {score:.2f} (Receita: R${receita_media:.2f}, Crescimento: {crescimento:.1%})")
+        # Calcular score baseado em:
+        # 1. Receita média
+        # 2. Tendência de crescimento
+        # 3. Consistência (menos variação = melhor)
         
-        # Normalizar scores para probabilidades
-        total_score = sum(produto_scores.values())
-        if total_score > 0:
-            for produto_id in produto_scores:
-                produto_scores[produto_id] = produto_scores[produto_id] / total_score
+        receita_media = sum(receitas_mensais) / len(receitas_mensais)
         
-        # Gerar previsões para os próximos 3 meses
-        for i in range(3):
-            data_prevista = datetime.now() + timedelta(days=30*(i+1))
-            
-            # Receita prevista para o mês (se temos dados)
-            if 'receita_forecast' in locals() and i < len(receita_forecast):
-                receita_mes = max(0, float(receita_forecast[i]))  # Usar índice da lista
-            else:
-                # Fallback: usar média das vendas passadas
-                receita_media = db.query(func.avg(Venda.valor_total)).scalar() or 1000
-                receita_mes = receita_media * 30  # Estimativa mensal
-            
-            # Distribuir a receita entre produtos baseado nas probabilidades
-            for produto_id, probabilidade in produto_scores.items():
-                if probabilidade > 0:
-                    receita_produto = receita_mes * probabilidade
-                    
-                    # Intervalo de confiança
-                    intervalo_inf = receita_produto * 0.7
-                    intervalo_sup = receita_produto * 1.3
-                    intervalo_conf = f"R$ {intervalo_inf:.2f} - R$ {intervalo_sup:.2f}"
-                    
-                    forecast = Forecast(
-                        produto_id=produto_id,
-                        data_prevista=data_prevista.date(),
-                        qtd_prevista=receita_produto,  # Usando campo existente para receita
-                        intervalo_conf=intervalo_conf
-                    )
-                    db.add(forecast)
-                    total_forecasts += 1
+        if len(receitas_mensais) >= 2:
+            # Tendência de crescimento
+            crescimento = (receitas_mensais[-1] - receitas_mensais[0]) / receitas_mensais[0]
+            # Consistência (inverso do coeficiente de variação)
+            variancia = sum((x - receita_media) ** 2 for x in receitas_mensais) / len(receitas_mensais)
+            desvio_padrao = math.sqrt(variancia)
+            coef_variacao = desvio_padrao / receita_media if receita_media > 0 else 1
+            consistencia = 1 / (coef_variacao + 0.1)
+        else:
+            crescimento = 0
+            consistencia = 1
         
-        db.commit()
+        # Score composto
+        score = receita_media * (1 + crescimento) * consistencia
+        produto_scores[produto.id] = max(0, score)
         
-        # Mostrar TOP 3 produtos previstos
-        top_produtos = sorted(produto_scores.items(), key=lambda x: x[1], reverse=True)[:3]
-        print(f"\n🏆 TOP 3 produtos previstos para próximos meses:")
-        for i, (produto_id, prob) in enumerate(top_produtos, 1):
-            produto = db.query(Produto).filter(Produto.id == produto_id).first()
-            print(f"   {i}º {produto.nome}: {prob:.1%} de probabilidade")
+        print(f"📈 {produto.nome}: Score = {score:.2f} (Receita: R${receita_media:.2f}, Crescimento: {crescimento:.1%})")
+    
+    # Normalizar scores para probabilidades
+    total_score = sum(produto_scores.values())
+    if total_score > 0:
+        for produto_id in produto_scores:
+            produto_scores[produto_id] = produto_scores[produto_id] / total_score
+    
+    progresso('gravando', 0.8)
+    
+    # Gerar previsões para os próximos 3 meses
+    for i in range(3):
+        data_prevista = datetime.now() + timedelta(days=30*(i+1))
         
-        print(f"\n✅ ML executado com sucesso! {total_forecasts} previsões de receita geradas")
+        # Receita prevista para o mês (se temos dados)
+        if i < len(receita_forecast):
+            receita_mes = max(0, float(receita_forecast[i]))  # Usar índice da lista
+        else:
+            # Fallback: usar média das vendas passadas do usuário
+            receita_media = db.query(
+                func.sum(VendaMensal.receita) / func.sum(VendaMensal.num_vendas)
+            ).filter(do_usuario).scalar() or 1000
+            receita_mes = receita_media * 30  # Estimativa mensal
         
-    except Exception as e:
-        print(f"❌ Erro geral no ML: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        db.rollback()
-        raise e
-    finally:
-        db.close()
+        # Distribuir a receita entre produtos baseado nas probabilidades
+        for produto_id, probabilidade in produto_scores.items():
+            if probabilidade > 0:
+                receita_produto = receita_mes * probabilidade
+                
+                # Intervalo de confiança
+                intervalo_inf = receita_produto * 0.7
+                intervalo_sup = receita_produto * 1.3
+                intervalo_conf = f"R$ {intervalo_inf:.2f} - R$ {intervalo_sup:.2f}"
+                
+                forecast = Forecast(
+                    usuario_id=usuario_id,
+                    produto_id=produto_id,
+                    data_prevista=data_prevista.date(),
+                    qtd_prevista=receita_produto,  # Usando campo existente para receita
+                    intervalo_conf=intervalo_conf
+                )
+                db.add(forecast)
+                total_forecasts += 1
+    
+    # Nova versão das previsões só deste usuário (ETag do /forecast)
+    db.query(Usuario).filter(Usuario.id == usuario_id)\
+        .update({Usuario.versao_previsoes: Usuario.versao_previsoes + 1}, synchronize_session=False)
+    db.commit()
+    
+    # Mostrar TOP 3 produtos previstos
+    top_produtos = sorted(produto_scores.items(), key=lambda x: x[1], reverse=True)[:3]
+    print(f"\n🏆 TOP 3 produtos previstos para próximos meses:")
+    nomes = {produto.id: produto.nome for produto in produtos}
+    for i, (produto_id, prob) in enumerate(top_produtos, 1):
+        print(f"   {i}º {nomes[produto_id]}: {prob:.1%} de probabilidade")
+    
+    print(f"\n✅ ML executado com sucesso! {total_forecasts} previsões de receita geradas")
+    progresso('concluido', 1.0)
+    return total_forecasts
 
 if __name__ == "__main__":
-    gerar_forecast()
+    # python ml/ml.py [usuario_id]: sem argumento, gera para todos os usuários com vendas
+    gerar_forecast(int(sys.argv[1]) if len(sys.argv) > 1 else None)
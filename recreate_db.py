@@ -7,10 +7,11 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from backend.database import engine
-from backend.models import Base, Usuario, Produto, Venda
+from backend.models import Usuario, Produto
+from backend.migrations import aplicar_migracoes
+from backend.importer import importar_vendas
 from backend.auth import get_password_hash
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
 
 def recreate_database():
     print("🗑️ Tentando remover banco antigo...")
@@ -22,7 +23,7 @@ def recreate_database():
         print("🔄 Continuando com criação da nova estrutura...")
     
     print("🏗️ Criando nova estrutura do banco...")
-    Base.metadata.create_all(bind=engine)
+    aplicar_migracoes(engine)
     print("✅ Estrutura criada com sucesso!")
     
     # Criar usuário admin
@@ -56,28 +57,34 @@ def recreate_database():
     db.commit()
     print("✅ Produtos de exemplo criados!")
     
-    # Criar algumas vendas de exemplo para o admin
+    # Criar algumas vendas de exemplo para o admin, pelo mesmo caminho da importação
+    # (preenche vendas.mes, os resumos vendas_mensais e vendas_ticket e os hashes)
     print("💰 Criando vendas de exemplo...")
     produtos = db.query(Produto).all()
     vendas_exemplo = [
-        {"data": datetime(2024, 1, 15).date(), "produto_id": produtos[0].id, "quantidade": 2, "valor_total": 5000.00},
-        {"data": datetime(2024, 1, 20).date(), "produto_id": produtos[1].id, "quantidade": 5, "valor_total": 750.00},
-        {"data": datetime(2024, 2, 10).date(), "produto_id": produtos[2].id, "quantidade": 3, "valor_total": 900.00},
-        {"data": datetime(2024, 2, 15).date(), "produto_id": produtos[3].id, "quantidade": 1, "valor_total": 800.00},
-        {"data": datetime(2024, 3, 5).date(), "produto_id": produtos[4].id, "quantidade": 4, "valor_total": 800.00},
-        {"data": datetime(2024, 3, 12).date(), "produto_id": produtos[0].id, "quantidade": 1, "valor_total": 2500.00},
-        {"data": datetime(2024, 3, 20).date(), "produto_id": produtos[1].id, "quantidade": 3, "valor_total": 450.00},
-        {"data": datetime(2024, 4, 2).date(), "produto_id": produtos[2].id, "quantidade": 2, "valor_total": 600.00},
-        {"data": datetime(2024, 4, 8).date(), "produto_id": produtos[3].id, "quantidade": 2, "valor_total": 1600.00},
-        {"data": datetime(2024, 4, 15).date(), "produto_id": produtos[4].id, "quantidade": 6, "valor_total": 1200.00}
+        {"data": "2024-01-15", "produto": produtos[0], "quantidade": 2, "valor_total": 5000.00},
+        {"data": "2024-01-20", "produto": produtos[1], "quantidade": 5, "valor_total": 750.00},
+        {"data": "2024-02-10", "produto": produtos[2], "quantidade": 3, "valor_total": 900.00},
+        {"data": "2024-02-15", "produto": produtos[3], "quantidade": 1, "valor_total": 800.00},
+        {"data": "2024-03-05", "produto": produtos[4], "quantidade": 4, "valor_total": 800.00},
+        {"data": "2024-03-12", "produto": produtos[0], "quantidade": 1, "valor_total": 2500.00},
+        {"data": "2024-03-20", "produto": produtos[1], "quantidade": 3, "valor_total": 450.00},
+        {"data": "2024-04-02", "produto": produtos[2], "quantidade": 2, "valor_total": 600.00},
+        {"data": "2024-04-08", "produto": produtos[3], "quantidade": 2, "valor_total": 1600.00},
+        {"data": "2024-04-15", "produto": produtos[4], "quantidade": 6, "valor_total": 1200.00}
     ]
     
-    for venda_data in vendas_exemplo:
-        venda = Venda(
-            **venda_data,
-            usuario_id=admin_user.id  # Associar ao admin
-        )
-        db.add(venda)
+    importar_vendas(db, [
+        {
+            "data": venda["data"],
+            "produto": venda["produto"].nome,
+            "categoria": venda["produto"].categoria,
+            "preco": str(venda["produto"].preco),
+            "quantidade": str(venda["quantidade"]),
+            "valor_total": str(venda["valor_total"]),
+        }
+        for venda in vendas_exemplo
+    ], admin_user.id)  # Associar ao admin
     
     db.commit()
     print("✅ Vendas de exemplo criadas!")
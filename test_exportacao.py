@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Script para testar o /export/vendas e o /export/forecast
+
+Importa vendas para um usuário novo, grava previsões para ele e para outro
+usuário, e confere que as exportações em NDJSON e CSV trazem exatamente as
+linhas do usuário, na ordem, com o filtro de período aplicado. Usa lotes
+pequenos no cursor para que a resposta saia em vários blocos.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/teste.db")
+os.environ.setdefault('EXPORT_YIELD_PER', '100')
+
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.database import SessionLocal
+from backend.models import Produto, Forecast
+from testes_auxiliares import importar_linhas, registrar
+
+NUM_VENDAS = 730
+
+def _importar(usuario_id, nome):
+    return importar_linhas(usuario_id, (
+        [(date(2024, 1, 1) + timedelta(days=i % 366)).isoformat(), nome, 'Anéis', 100.0 + i, 1, 100.0 + i]
+        for i in range(NUM_VENDAS)
+    ))
+
+def test_exportacao():
+    print("📤 Testando /export")
+    sufixo = uuid.uuid4().hex[:8]
+    with TestClient(app) as client:
+        usuario_id, headers = registrar(client, f"export_{sufixo}@teste.com")
+        outro_usuario_id, _ = registrar(client, f"export_outro_{sufixo}@teste.com")
+        _importar(usuario_id, f'Anel {sufixo}')
+
+        db = SessionLocal()
+        try:
+            produto_id = db.query(Produto.id).filter(Produto.nome == f'Anel {sufixo}').scalar()
+            db.add_all([
+                Forecast(usuario_id=dono, produto_id=produto_id, data_prevista=date(2025, mes, 1),
+                         qtd_prevista=1000.0 + mes, intervalo_conf="[900.0,1100.0]")
+                for dono in (usuario_id, outro_usuario_id) for mes in range(1, 13)
+            ])
+            db.commit()
+        finally:
+            db.close()
+
+        resposta = client.get("/export/vendas", headers=headers)
+        assert resposta.status_code == 200
+        assert resposta.headers['content-type'].startswith('application/x-ndjson')
+        assert 'vendas.ndjson' in resposta.headers['content-disposition']
+        vendas = [json.loads(linha) for linha in resposta.text.splitlines()]
+        assert len(vendas) == NUM_VENDAS
+        assert [v['data'] for v in vendas] == sorted(v['data'] for v in vendas)
+        assert set(vendas[0]) == {'id', 'data', 'produto_id', 'produto', 'categoria', 'quantidade', 'valor_total'}
+        print(f"   📦 {len(vendas)} vendas em NDJSON")
+
+        periodo = {'start': '2024-03-01', 'end': '2024-03-31'}
+        resposta = client.get("/export/vendas", headers=headers, params={**periodo, 'formato': 'csv'})
+        assert resposta.headers['content-type'].startswith('text/csv')
+        linhas = list(csv.DictReader(io.StringIO(resposta.text)))
+        esperado = sum(1 for i in range(NUM_VENDAS) if (date(2024, 1, 1) + timedelta(days=i % 366)).month == 3)
+        assert len(linhas) == esperado
+        assert all(periodo['start'] <= linha['data'] <= periodo['end'] for linha in linhas)
+
+        previsoes = [json.loads(linha) for linha in client.get("/export/forecast", headers=headers).text.splitlines()]
+        assert len(previsoes) == 12
+        assert [p['qtd_prevista'] for p in previsoes] == [1000.0 + mes for mes in range(1, 13)]
+        resposta = client.get("/export/forecast", headers=headers,
+                              params={'formato': 'csv', 'start': '2025-06-01', 'end': '2025-08-31'})
+        leitor = csv.reader(io.StringIO(resposta.text))
+        assert next(leitor) == ['produto_id', 'produto', 'data_prevista', 'qtd_prevista', 'intervalo_conf']
+        assert [linha[2] for linha in leitor] == ['2025-06-01', '2025-07-01', '2025-08-01']
+
+        assert client.get("/export/vendas", headers=headers, params={'start': '2024-12-31', 'end': '2024-01-01'}).status_code == 400
+        assert client.get("/export/vendas", headers=headers, params={'formato': 'xml'}).status_code == 422
+        assert client.get("/export/forecast").status_code == 401
+        print("✅ Exportação em NDJSON e CSV, com filtro de período")
+
+if __name__ == "__main__":
+    test_exportacao()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Script para testar o /forecast: cada previsão aparece uma única vez
+
+Importa muitas vendas dos mesmos produtos para um usuário novo, grava
+previsões para esses produtos e para um produto que ele não vendeu, e
+confere que a resposta tem exatamente uma linha por previsão do usuário,
+sem repetir por venda nem mostrar previsões de outro usuário. Depois
+percorre as páginas pelo cursor e confere filtros e projeção de campos.
+Por fim, confere que gerar as previsões de um usuário não toca nas dos outros
+(nem no ETag delas, mesmo lendo de uma réplica atrasada) e que o /run-ml
+roda como job, com andamento em GET /run-ml/{job_id}.
+"""
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/teste.db")
+
+from fastapi.testclient import TestClient
+from backend import previsoes as modulo_previsoes
+from backend.auth import get_current_user
+from backend.main import app
+from backend.database import SessionLocal
+from backend.models import Usuario, Produto, Forecast
+from ml.ml import gerar_forecast
+from testes_auxiliares import importar_linhas, registrar
+
+VENDAS_POR_PRODUTO = 500
+MESES_PREVISTOS = 3
+
+def _importar(usuario_id, produtos):
+    return importar_linhas(usuario_id, (
+        [(date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(), nome, 'Anéis', 100.0 + i, 1, 100.0 + i]
+        for nome in produtos for i in range(VENDAS_POR_PRODUTO)
+    ))
+
+def _versao_dados(usuario_id):
+    db = SessionLocal()
+    try:
+        return db.query(Usuario.versao_dados).filter(Usuario.id == usuario_id).scalar()
+    finally:
+        db.close()
+
+def test_forecast_sem_repeticao():
+    print("🔮 Testando /forecast")
+    sufixo = uuid.uuid4().hex[:8]
+    vendidos = [f'Anel {sufixo}', f'Colar {sufixo}']
+    with TestClient(app) as client:
+        usuario_id, headers = registrar(client, f"forecast_{sufixo}@teste.com")
+        outro_usuario_id, _ = registrar(client, f"forecast_outro_{sufixo}@teste.com")
+
+        db = SessionLocal()
+        try:
+            _importar(usuario_id, vendidos)
+            outro = Produto(nome=f'Pulseira {sufixo}', categoria='Pulseiras', preco=50.0)
+            db.add(outro)
+            db.flush()
+            outro_id = outro.id
+            ids = [i for (i,) in db.query(Produto.id).filter(Produto.nome.in_(vendidos))]
+            # Previsões do usuário e de outro usuário (inclusive dos mesmos produtos)
+            db.add_all([
+                Forecast(usuario_id=dono, produto_id=produto_id, data_prevista=date(2025, mes, 1),
+                         qtd_prevista=1000.0, intervalo_conf="[900.0,1100.0]")
+                for dono, produtos in ((usuario_id, ids), (outro_usuario_id, ids + [outro_id]))
+                for produto_id in produtos for mes in range(1, MESES_PREVISTOS + 1)
+            ])
+            db.commit()
+        finally:
+            db.close()
+        ids.append(outro_id)
+
+        previsoes = [p for p in client.get("/forecast", headers=headers).json() if p['produto_id'] in ids]
+        esperado = len(vendidos) * MESES_PREVISTOS
+        print(f"   📦 {len(previsoes)} previsões ({VENDAS_POR_PRODUTO} vendas por produto)")
+        assert len(previsoes) == esperado, len(previsoes)
+        assert len({(p['produto_id'], p['data_prevista']) for p in previsoes}) == esperado
+        assert outro_id not in {p['produto_id'] for p in previsoes}
+        print("✅ Uma linha por previsão, só as do próprio usuário")
+
+        # Páginas de 2 pelo cursor: mesmas previsões, em ordem (data_prevista, produto_id), sem repetir
+        filtro = {'produto_id': ids}
+        completas = client.get("/forecast", headers=headers, params=filtro).json()
+        paginas, cursor = [], None
+        while True:
+            params = {**filtro, 'limit': 2, **({'cursor': cursor} if cursor else {})}
+            response = client.get("/forecast", headers=headers, params=params)
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            paginas.extend(response.json())
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        assert paginas == completas == sorted(completas, key=lambda p: (p['data_prevista'], p['produto_id']))
+        assert len(paginas) == esperado
+
+        # Filtros de produto e período e projeção de campos
+        um_produto = client.get("/forecast", headers=headers, params={
+            'produto_id': ids[0], 'start': '2025-02-01', 'end': '2025-02-28', 'fields': 'data_prevista,qtd_prevista',
+        }).json()
+        assert um_produto == [{'data_prevista': '2025-02-01', 'qtd_prevista': 1000.0}]
+        assert client.get("/forecast", headers=headers, params={'fields': 'preco'}).status_code == 400
+        assert client.get("/forecast", headers=headers, params={'cursor': 'invalido'}).status_code == 400
+        print("✅ Paginação por cursor, filtros e projeção de campos")
+
+def test_regeneracao_por_usuario():
+    print("🤖 Testando ML por usuário")
+    sufixo = uuid.uuid4().hex[:8]
+    with TestClient(app) as client:
+        a, headers_a = registrar(client, f"ml_a_{sufixo}@teste.com")
+        b, headers_b = registrar(client, f"ml_b_{sufixo}@teste.com")
+        _importar(a, [f'Anel {sufixo}'])
+        _importar(b, [f'Colar {sufixo}', f'Brinco {sufixo}'])
+        gerar_forecast(a)
+        gerar_forecast(b)
+
+        def estado(usuario_id):
+            db = SessionLocal()
+            try:
+                previsoes = sorted(i for (i,) in db.query(Forecast.id).filter(Forecast.usuario_id == usuario_id))
+                produtos = {p for (p,) in db.query(Forecast.produto_id).filter(Forecast.usuario_id == usuario_id)}
+                versao = db.query(Usuario.versao_previsoes).filter(Usuario.id == usuario_id).scalar()
+                return previsoes, produtos, versao
+            finally:
+                db.close()
+
+        previsoes_a, produtos_a, versao_a = estado(a)
+        previsoes_b, produtos_b, versao_b = estado(b)
+        versao_dados_b = _versao_dados(b)
+        assert len(produtos_a) == 1 and len(produtos_b) == 2 and not produtos_a & produtos_b
+
+        etag_b = client.get("/forecast", headers=headers_b).headers['ETag']
+        gerar_forecast(a)
+        novas_a, _, nova_versao_a = estado(a)
+        assert novas_a != previsoes_a and len(novas_a) == len(previsoes_a) and nova_versao_a == versao_a + 1
+        assert estado(b) == (previsoes_b, produtos_b, versao_b)
+        assert client.get("/forecast", headers={**headers_b, 'If-None-Match': etag_b}).status_code == 304
+        assert {p['produto_id'] for p in client.get("/forecast", headers=headers_a).json()} == produtos_a
+
+        # Réplica atrasada: o banco de escrita já tem previsões novas de B que a
+        # réplica não viu; as linhas antigas não podem sair com o ETag novo
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+            id=b, versao_dados=versao_dados_b, versao_previsoes=versao_b + 1)
+        modulo_previsoes.LEITURA_EM_REPLICA = True
+        try:
+            assert client.get("/forecast", headers=headers_b).headers['ETag'] == etag_b
+        finally:
+            modulo_previsoes.LEITURA_EM_REPLICA = False
+            app.dependency_overrides.pop(get_current_user)
+        print("✅ Previsões regeradas só para o usuário pedido")
+
+def test_run_ml_em_job():
+    print("⚙️ Testando /run-ml em job")
+    sufixo = uuid.uuid4().hex[:8]
+    with TestClient(app) as client:
+        usuario_id, headers = registrar(client, f"ml_job_{sufixo}@teste.com")
+        _, headers_outro = registrar(client, f"ml_job_outro_{sufixo}@teste.com")
+        _importar(usuario_id, [f'Anel {sufixo}', f'Colar {sufixo}'])
+
+        resposta = client.post("/run-ml", headers=headers)
+        assert resposta.status_code == 202
+        job = resposta.json()
+        assert job['status'] in ('pendente', 'processando', 'concluido')
+        limite = time.time() + 60
+        while job['status'] in ('pendente', 'processando') and time.time() < limite:
+            time.sleep(0.05)
+            job = client.get(f"/run-ml/{job['job_id']}", headers=headers).json()
+        assert job['status'] == 'concluido', job
+        assert job['progresso'] == 100.0 and job['etapa'] == 'concluido'
+
+        db = SessionLocal()
+        try:
+            gravadas = db.query(Forecast).filter(Forecast.usuario_id == usuario_id).count()
+        finally:
+            db.close()
+        assert job['previsoes_geradas'] == gravadas > 0
+        assert client.get(f"/run-ml/{job['job_id']}", headers=headers_outro).status_code == 404
+        assert client.get("/run-ml/inexistente", headers=headers).status_code == 404
+        print(f"✅ Job de ML concluído com {gravadas} previsões")
+
+if __name__ == "__main__":
+    test_forecast_sem_repeticao()
+    test_regeneracao_por_usuario()
+    test_run_ml_em_job()
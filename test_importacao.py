@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Script para testar a importação de vendas
+
+Confere o relatório de linhas rejeitadas (número da linha e motivo,
+inclusive nan e inf) no modo sequencial, no paralelo e no Parquet; os modos
+estrito (desfaz tudo), parcial (grava só as válidas) e validar (não grava
+nada); o descarte de um arquivo já importado; o estado do job do POST
+/import, completo desde o 202; e que as cópias gzip e Parquet do arquivo de
+exemplo gravam as mesmas vendas, com os mesmos hashes, que o CSV. Confere
+também que linhas idênticas no mesmo arquivo são todas gravadas (são vendas
+distintas) e que reenviar o arquivo, ou outro que repita as mesmas linhas,
+não grava nada de novo.
+"""
+import gzip
+import io
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/teste.db")
+
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.database import SessionLocal
+from backend.importer import importar_vendas_paralelo, salvar_upload
+from backend.models import Produto, Venda, VendaHash
+from testes_auxiliares import csv_vendas, importar, importar_linhas, registrar
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+VALIDAS_NO_FIM = 60
+
+def _arquivo_com_erros(sufixo):
+    """Linhas do CSV com erros em posições conhecidas: (linhas, {linha do arquivo: início do motivo})"""
+    produto = f'Anel {sufixo}'
+    linhas = [
+        ['2024-02-01', produto, 'Anéis', 10.0, 1, 10.0],
+        ['2024-13-01', produto, 'Anéis', 10.0, 1, 10.0],
+        ['2024-02-02', produto, 'Anéis', 10.0, 1, 10.0],
+        ['2024-02-03', produto, 'Anéis', 'abc', 1, 10.0],
+        ['2024-02-04', produto, 'Anéis', 10.0, '1.5', 15.0],
+        ['2024-02-05', produto, 'Anéis', 10.0, 2, 25.0],
+        ['2024-02-06', produto, 'Anéis', 'inf', 1, 10.0],
+        ['2024-02-07', produto, 'Anéis', 10.0, 1, 'nan'],
+    ]
+    linhas += [[f'2024-03-{i % 28 + 1:02d}', produto, 'Anéis', 10.0 + i, 1, 10.0 + i] for i in range(VALIDAS_NO_FIM)]
+    linhas.append(['2024-04-01', '', 'Anéis', 10.0, 1, 10.0])
+    erros = {
+        3: "valor inválido em data",
+        5: "valor inválido em preco",
+        6: "valor inválido em quantidade",
+        7: "valor_total 25.0 difere",
+        8: "valor inválido em preco",
+        9: "valor inválido em valor_total",
+        len(linhas) + 1: "produto ausente",
+    }
+    return linhas, erros
+
+def _conferir_rejeicoes(resultado, erros):
+    rejeicoes = {r['linha']: r['motivo'] for r in resultado['rejeicoes']}
+    assert sorted(rejeicoes) == sorted(erros), resultado['rejeicoes']
+    assert all(rejeicoes[linha].startswith(motivo) for linha, motivo in erros.items()), resultado['rejeicoes']
+    assert resultado['linhas_rejeitadas'] == len(erros)
+
+def _contar_vendas(usuario_id):
+    db = SessionLocal()
+    try:
+        return db.query(Venda).filter(Venda.usuario_id == usuario_id).count()
+    finally:
+        db.close()
+
+def test_linhas_identicas():
+    print("👯 Testando linhas idênticas")
+    sufixo = uuid.uuid4().hex[:8]
+    with TestClient(app) as client:
+        usuario_id, _ = registrar(client, f"identicas_{sufixo}@teste.com")
+        anel = ['2024-05-10', f'Anel {sufixo}', 'Anéis', 1200.0, 1, 1200.0]
+        colar = ['2024-05-10', f'Colar {sufixo}', 'Colares', 800.0, 2, 1600.0]
+        linhas = [anel, colar, anel, anel, colar]
+
+        resultado = importar_linhas(usuario_id, linhas)
+        assert resultado['linhas_duplicadas'] == 0
+        assert _contar_vendas(usuario_id) == len(linhas)
+
+        # Mesmo conteúdo com outro hash de arquivo (linha em branco no fim): nenhuma venda nova
+        resultado = importar(usuario_id, csv_vendas(linhas) + b'\r\n')
+        assert resultado['linhas_duplicadas'] == len(linhas)
+        # Exportação sobreposta: repete parte das linhas e traz uma a mais
+        resultado = importar_linhas(usuario_id, [anel, anel, anel, anel])
+        assert resultado['linhas_duplicadas'] == 3
+        assert _contar_vendas(usuario_id) == len(linhas) + 1
+        print("✅ Linhas idênticas gravadas e reenvio sem vendas novas")
+
+def test_rejeicoes_e_modos():
+    print("🧪 Testando validação e modos de importação")
+    sufixo = uuid.uuid4().hex[:8]
+    linhas, erros = _arquivo_com_erros(sufixo)
+    conteudo = csv_vendas(linhas)
+    validas = len(linhas) - len(erros)
+    with TestClient(app) as client:
+        usuario_id, _ = registrar(client, f"importacao_{sufixo}@teste.com")
+
+        resultado = importar(usuario_id, conteudo, modo='validar')
+        _conferir_rejeicoes(resultado, erros)
+        assert resultado['mensagem'].startswith(f"Validação concluída: {validas} linha(s) válida(s)")
+        assert _contar_vendas(usuario_id) == 0
+
+        # Paralelo: faixas de poucas linhas, numeração relativa ao arquivo inteiro
+        paralelo = importar(usuario_id, conteudo, modo='validar', paralelo=True)
+        assert paralelo['rejeicoes'] == resultado['rejeicoes']
+        caminho, _ = salvar_upload(io.BytesIO(conteudo))
+        db = SessionLocal()
+        try:
+            faixas = importar_vendas_paralelo(db, caminho, usuario_id, 'validar', processos=2, tamanho_faixa=200)
+        finally:
+            db.close()
+            os.remove(caminho)
+        assert faixas['rejeicoes'] == resultado['rejeicoes']
+        assert faixas['linhas_processadas'] == len(linhas)
+
+        # Estrito: uma linha inválida desfaz tudo, e o arquivo não conta como importado
+        try:
+            importar(usuario_id, conteudo, modo='estrito')
+            assert False, "importação estrita com linhas inválidas deveria falhar"
+        except ValueError as e:
+            assert f"{len(erros)} linha(s) inválida(s)" in str(e)
+        assert _contar_vendas(usuario_id) == 0
+
+        resultado = importar(usuario_id, conteudo, modo='parcial')
+        _conferir_rejeicoes(resultado, erros)
+        assert resultado['mensagem'] == "Importação realizada"
+        assert _contar_vendas(usuario_id) == validas
+
+        # Mesmo arquivo de novo: descartado sem ler as linhas
+        resultado = importar(usuario_id, conteudo, modo='parcial')
+        assert resultado == {'mensagem': "Arquivo já importado anteriormente"}
+        assert _contar_vendas(usuario_id) == validas
+
+        if pa is None:
+            print("   ⚠️ pyarrow ausente: Parquet não testado")
+        else:
+            # Parquet com tudo em texto: valores inconvertíveis rejeitam só a própria linha
+            tabela = pa.table({
+                coluna: pa.array([str(linha[i]) for linha in linhas], pa.string())
+                for i, coluna in enumerate(['data', 'produto', 'categoria', 'preco', 'quantidade', 'valor_total'])
+            })
+            arquivo = io.BytesIO()
+            pq.write_table(tabela, arquivo)
+            resultado = importar(usuario_id, arquivo.getvalue(), 'teste.parquet', modo='validar')
+            # No Parquet a linha é o número do registro (a partir de 1)
+            motivos = {linha - 1: motivo.split(':')[0] for linha, motivo in erros.items()}
+            motivos[2] = "data ausente ou inválida"
+            motivos[6] = "valor_total difere"
+            _conferir_rejeicoes(resultado, motivos)
+
+            # Colunas numéricas nativas: nan e inf também rejeitam só a própria linha
+            tabela = pa.table({
+                'data': ['2024-02-01'] * 3, 'produto': [f'Anel {sufixo}'] * 3,
+                'preco': [10.0, float('inf'), 10.0], 'quantidade': [1, 1, 1],
+                'valor_total': [10.0, 10.0, float('nan')],
+            })
+            arquivo = io.BytesIO()
+            pq.write_table(tabela, arquivo)
+            resultado = importar(usuario_id, arquivo.getvalue(), 'teste.parquet', modo='validar')
+            _conferir_rejeicoes(resultado, {2: "valor inválido em preco", 3: "valor inválido em valor_total"})
+        print("✅ Relatório de rejeições e modos estrito, parcial e validar")
+
+def test_job_de_importacao():
+    print("📨 Testando POST /import e GET /import/{job_id}")
+    sufixo = uuid.uuid4().hex[:8]
+    linhas, erros = _arquivo_com_erros(sufixo)
+    with TestClient(app) as client:
+        _, headers = registrar(client, f"job_{sufixo}@teste.com")
+        resposta = client.post("/import", headers=headers, params={'modo': 'parcial'},
+                               files={'file': ('teste.csv', csv_vendas(linhas))})
+        assert resposta.status_code == 202
+        job = resposta.json()
+        # Todos os campos de ImportResponse desde o início, sem null
+        assert job['status'] == 'pendente' and job['rejeicoes'] == [], job
+        assert job['linhas_processadas'] == job['linhas_rejeitadas'] == job['linhas_duplicadas'] == 0
+        limite = time.time() + 60
+        while job['status'] in ('pendente', 'processando') and time.time() < limite:
+            time.sleep(0.05)
+            job = client.get(f"/import/{job['job_id']}", headers=headers).json()
+            assert job['rejeicoes'] is not None, job
+        assert job['status'] == 'concluido', job
+        _conferir_rejeicoes(job, erros)
+        print("✅ Estado do job completo do 202 ao fim")
+
+def test_formatos_equivalentes():
+    print("🗜️ Testando CSV, CSV.GZ e Parquet")
+    sufixo = uuid.uuid4().hex[:8]
+    with open(os.path.join(RAIZ, 'vendas_joalheria_2025.csv'), 'rb') as arquivo:
+        conteudo = arquivo.read()
+    copias = {'teste.csv': conteudo, 'teste.csv.gz': gzip.compress(conteudo)}
+    if pa is None:
+        print("   ⚠️ pyarrow ausente: Parquet não testado")
+    else:
+        arquivo = io.BytesIO()
+        pq.write_table(pa_csv.read_csv(io.BytesIO(conteudo)), arquivo)
+        copias['teste.parquet'] = arquivo.getvalue()
+
+    with TestClient(app) as client:
+        gravadas = {}
+        for nome, copia in copias.items():
+            usuario_id, _ = registrar(client, f"formato_{nome}_{sufixo}@teste.com")
+            resultado = importar(usuario_id, copia, nome)
+            assert resultado['linhas_rejeitadas'] == 0 and resultado['linhas_duplicadas'] == 0, resultado
+            db = SessionLocal()
+            try:
+                vendas = sorted(
+                    db.query(Venda.data, Produto.nome, Venda.quantidade, Venda.valor_total, Venda.mes)
+                    .join(Produto).filter(Venda.usuario_id == usuario_id)
+                )
+                hashes = {h for (h,) in db.query(VendaHash.hash).filter(VendaHash.usuario_id == usuario_id)}
+            finally:
+                db.close()
+            gravadas[nome] = (vendas, hashes)
+
+        vendas, hashes = gravadas['teste.csv']
+        assert len(vendas) == len(hashes) == conteudo.count(b'\n') - 1
+        assert all(outra == (vendas, hashes) for outra in gravadas.values())
+        print(f"✅ {len(vendas)} vendas iguais em {', '.join(copias)}")
+
+if __name__ == "__main__":
+    test_linhas_identicas()
+    test_rejeicoes_e_modos()
+    test_job_de_importacao()
+    test_formatos_equivalentes()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Script para testar o /metrics: número de consultas e valores
+
+Importa vendas para um usuário novo num banco temporário e confere que o
+endpoint faz no máximo três consultas (aos resumos mensais), que os KPIs
+e os percentis do ticket batem com as agregações feitas diretamente sobre a
+tabela vendas e que o
+cache e o ETag só mudam com uma nova importação. Com start, end e
+granularity, confere os totais do período e a soma da evolução. Por fim,
+simula uma réplica de leitura atrasada.
+"""
+import os
+import random
+import tempfile
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/teste.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from backend import metricas as modulo_metricas
+from backend.auth import get_current_user
+from backend.main import app
+from backend.database import SessionLocal, async_read_engine
+from backend.models import Usuario, Venda
+from testes_auxiliares import importar_linhas, registrar
+
+MAX_CONSULTAS = 3
+
+# Erro relativo máximo dos percentis (backend.distribuicao.PRECISAO)
+PRECISAO = 0.01
+
+def _linhas(quantidade):
+    produtos = [('Anel', 'Anéis', 1200.0), ('Colar', 'Colares', 800.0), ('Brinco', 'Brincos', 300.0), ('Pulseira', 'Pulseiras', 450.0)]
+    for _ in range(quantidade):
+        nome, categoria, preco = random.choice(produtos)
+        qtd = random.randint(1, 4)
+        yield {
+            'data': (date(2024, 1, 1) + timedelta(days=random.randint(0, 120))).isoformat(),
+            'produto': f'{nome} {uuid.uuid4().hex[:4]}' if random.random() < 0.1 else nome,
+            'categoria': categoria,
+            'preco': str(preco),
+            'quantidade': str(qtd),
+            'valor_total': str(preco * qtd),
+        }
+
+def _importar(usuario_id, quantidade):
+    """Importa pelo mesmo job do POST /import"""
+    return importar_linhas(usuario_id, _linhas(quantidade))
+
+def _consultar(client, headers, params=None):
+    """GET /metrics registrando as consultas feitas ao banco de leitura"""
+    consultas = []
+    def anotar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+    event.listen(async_read_engine.sync_engine, 'before_cursor_execute', anotar)
+    try:
+        response = client.get("/metrics", headers=headers, params=params)
+    finally:
+        event.remove(async_read_engine.sync_engine, 'before_cursor_execute', anotar)
+    assert response.status_code == 200
+    return response.json(), consultas
+
+def test_metricas():
+    print("📊 Testando /metrics")
+    with TestClient(app) as client:
+        usuario_id, headers = registrar(client, f"metricas_{uuid.uuid4().hex[:8]}@teste.com")
+        _importar(usuario_id, 2000)
+
+        db = SessionLocal()
+        try:
+            do_usuario = Venda.usuario_id == usuario_id
+            receita, total, unicos = db.query(
+                func.sum(Venda.valor_total), func.count(Venda.id), func.count(func.distinct(Venda.produto_id))
+            ).filter(do_usuario).one()
+            meses = db.query(Venda.mes, func.sum(Venda.valor_total)).filter(do_usuario)\
+                .group_by(Venda.mes).order_by(Venda.mes).all()
+            valores = sorted(v for (v,) in db.query(Venda.valor_total).filter(do_usuario))
+        finally:
+            db.close()
+
+        # Vendas idênticas no arquivo também são vendas: todas gravadas
+        assert total == 2000
+
+        metricas, consultas = _consultar(client, headers)
+        print(f"   🔎 {len(consultas)} consultas")
+        assert len(consultas) <= MAX_CONSULTAS, consultas
+
+        assert metricas['total_vendas'] == total
+        assert metricas['produtos_unicos'] == unicos
+        assert abs(metricas['receita_total'] - receita) < 0.01
+        assert abs(metricas['ticket_medio'] - receita / total) < 0.01
+        assert [m['mes'] for m in metricas['evolucao_mensal']] == [f"{m // 100}-{m % 100:02d}" for m, _ in meses]
+        assert all(abs(m['receita'] - r) < 0.01 for m, (_, r) in zip(metricas['evolucao_mensal'], meses))
+        assert sum(c['num_vendas'] for c in metricas['vendas_categoria']) == total
+        assert len(metricas['top_produtos']) == min(5, unicos)
+        for nome, quantil in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            real = valores[int(quantil * (len(valores) - 1))]
+            assert abs(metricas['ticket_percentis'][nome] - real) <= real * PRECISAO + 0.01, (nome, real)
+        assert sum(f['num_vendas'] for f in metricas['histograma_ticket']) == total
+        print("✅ Métricas conferem com as vendas importadas")
+
+        # Período que corta meses: lê vendas só no intervalo, evolução por dia/semana
+        inicio, fim = date(2024, 3, 10), date(2024, 4, 8)
+        db = SessionLocal()
+        try:
+            receita_periodo, total_periodo = db.query(func.sum(Venda.valor_total), func.count(Venda.id))\
+                .filter(do_usuario, Venda.data >= inicio, Venda.data <= fim).one()
+            dias = db.query(func.count(func.distinct(Venda.data)))\
+                .filter(do_usuario, Venda.data >= inicio, Venda.data <= fim).scalar()
+        finally:
+            db.close()
+        for granularidade, periodos in (('day', dias), ('week', 6), ('month', 2), ('quarter', 2)):
+            filtradas, consultas = _consultar(client, headers, {'start': inicio, 'end': fim, 'granularity': granularidade})
+            assert len(consultas) <= MAX_CONSULTAS, consultas
+            assert filtradas['total_vendas'] == total_periodo
+            assert abs(filtradas['receita_total'] - receita_periodo) < 0.01
+            assert len(filtradas['evolucao_mensal']) == periodos, (granularidade, filtradas['evolucao_mensal'])
+            assert abs(sum(p['receita'] for p in filtradas['evolucao_mensal']) - receita_periodo) < 0.01
+            assert sum(f['num_vendas'] for f in filtradas['histograma_ticket']) == total_periodo
+        assert [p['mes'] for p in filtradas['evolucao_mensal']] == ['2024-T1', '2024-T2']
+
+        # Meses inteiros: mesmo resultado pelo resumo mensal
+        trimestre, _ = _consultar(client, headers, {'start': '2024-01-01', 'end': '2024-03-31', 'granularity': 'quarter'})
+        assert trimestre['evolucao_mensal'][0]['mes'] == '2024-T1'
+        assert abs(trimestre['receita_total'] - sum(r for m, r in meses if m <= 202403)) < 0.01
+        assert client.get("/metrics", headers=headers, params={'start': fim, 'end': inicio}).status_code == 400
+
+        # Limites do calendário: o período inteiro equivale a não filtrar
+        for granularidade in ('week', 'month'):
+            extremos, _ = _consultar(client, headers, {'start': date.min, 'end': date.max, 'granularity': granularidade})
+            assert extremos['total_vendas'] == total and abs(extremos['receita_total'] - receita) < 0.01
+        print("✅ Filtros de período e granularidade conferem")
+
+        # Sem importação nova: resposta do cache, sem consultas
+        acertos = client.get("/metrics/cache", headers=headers).json()['acertos']
+        em_cache, consultas = _consultar(client, headers)
+        assert consultas == [] and em_cache == metricas
+        assert client.get("/metrics/cache", headers=headers).json()['acertos'] == acertos + 1
+
+        # Mesmo ETag enquanto a versão dos dados não muda: 304 sem corpo
+        etag = client.get("/metrics", headers=headers).headers['ETag']
+        nao_modificado = client.get("/metrics", headers={**headers, 'If-None-Match': etag})
+        assert nao_modificado.status_code == 304 and not nao_modificado.content
+
+        # Nova importação muda a versão dos dados e invalida o cache
+        resultado = _importar(usuario_id, 100)
+        novas = resultado['linhas_processadas'] - resultado['linhas_duplicadas']
+        atualizadas, consultas = _consultar(client, headers)
+        assert 0 < len(consultas) <= MAX_CONSULTAS
+        assert atualizadas['total_vendas'] == total + novas
+        assert client.get("/metrics", headers={**headers, 'If-None-Match': etag}).status_code == 200
+        print("✅ Cache e ETag reaproveitados e invalidados pela importação")
+
+        # Réplica atrasada: o banco de escrita já tem uma versão que a réplica não viu.
+        # O resultado não pode ficar em cache nem sair com o ETag da versão nova.
+        db = SessionLocal()
+        try:
+            versao = db.query(Usuario.versao_dados).filter(Usuario.id == usuario_id).scalar()
+        finally:
+            db.close()
+        app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=usuario_id, versao_dados=versao + 1)
+        modulo_metricas.LEITURA_EM_REPLICA = True
+        try:
+            falhas = client.get("/metrics/cache", headers=headers).json()['falhas']
+            for _ in range(2):
+                resposta = client.get("/metrics", headers=headers)
+                assert resposta.headers['ETag'].startswith(f'"metrics-{usuario_id}-{versao}-'), resposta.headers['ETag']
+            assert client.get("/metrics/cache", headers=headers).json()['falhas'] == falhas + 2
+        finally:
+            modulo_metricas.LEITURA_EM_REPLICA = False
+            app.dependency_overrides.pop(get_current_user)
+        print("✅ Resultado de réplica atrasada fica com a versão que ela enxerga")
+
+if __name__ == "__main__":
+    test_metricas()
@@ -63,12 +63,17 @@ def test_system():
     print("\n🤖 Testando execução do ML...")
     try:
         ml_response = requests.post(f"{API_URL}/run-ml", headers=headers)
-        if ml_response.status_code == 200:
-            result = ml_response.json()
-            if result["status"] == "success":
-                print("✅ ML executado com sucesso!")
+        if ml_response.status_code == 202:
+            # O ML roda em segundo plano: acompanhar o job até o fim
+            job = ml_response.json()
+            while job["status"] in ("pendente", "processando"):
+                time.sleep(1)
+                job = requests.get(f"{API_URL}/run-ml/{job['job_id']}", headers=headers).json()
+                print(f"   ⏳ {job.get('etapa') or job['status']}: {job['progresso']:.0f}%")
+            if job["status"] == "concluido":
+                print(f"✅ ML executado com sucesso! {job['previsoes_geradas']} previsões")
             else:
-                print(f"❌ Erro no ML: {result['message']}")
+                print(f"❌ Erro no ML: {job['mensagem']}")
         else:
             print("❌ Erro na requisição ML")
     except Exception as e:
@@ -0,0 +1,39 @@
+"""
+Funções compartilhadas pelos scripts de teste (test_*.py)
+
+Quem importa este módulo deve definir DATABASE_URL antes, como os testes fazem.
+"""
+import csv
+import io
+from backend.database import SessionLocal
+from backend.importer import executar_importacao, salvar_upload
+from backend.models import Usuario
+
+CABECALHO = ['data', 'produto', 'categoria', 'preco', 'quantidade', 'valor_total']
+
+def registrar(client, email):
+    """Cadastra e autentica o usuário; retorna (id, headers com o token)"""
+    client.post("/auth/register", json={"email": email, "password": "senha"})
+    token = client.post("/auth/login", data={"username": email, "password": "senha"}).json()['access_token']
+    db = SessionLocal()
+    try:
+        return db.query(Usuario.id).filter(Usuario.email == email).scalar(), {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+def csv_vendas(linhas):
+    """Conteúdo CSV (bytes) com o cabeçalho esperado e as linhas (listas ou dicts)"""
+    conteudo = io.StringIO()
+    escritor = csv.writer(conteudo)
+    escritor.writerow(CABECALHO)
+    escritor.writerows([linha[c] for c in CABECALHO] if isinstance(linha, dict) else linha for linha in linhas)
+    return conteudo.getvalue().encode('utf-8')
+
+def importar(usuario_id, conteudo, nome_arquivo='teste.csv', **opcoes):
+    """Importa o arquivo (bytes) pelo mesmo job do POST /import"""
+    caminho, arquivo_hash = salvar_upload(io.BytesIO(conteudo))
+    return executar_importacao('teste', caminho, arquivo_hash, nome_arquivo, usuario_id, **opcoes)
+
+def importar_linhas(usuario_id, linhas, **opcoes):
+    """Importa as linhas como um CSV"""
+    return importar(usuario_id, csv_vendas(linhas), **opcoes)